@@ -0,0 +1,125 @@
+'''
+Sheng Zhang
+HW1 | Search Algorithm: N-Puzzle -- batch solver
+
+Usage: python batch.py <method> <boards file> [--workers N] [--chunk-size K] [--node-limit N] [--time-limit S]
+
+Reads one comma-separated board per line, solves the boards in a pool of worker processes and writes one result
+line (JSON or CSV) per board as soon as it finishes, so results arrive in completion order rather than file order.
+The status of a board is solved, no_solution, unsolvable (rejected by the parity check, which took check_time
+seconds, without searching), limit or an error message.
+'''
+
+import sys
+import csv
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+
+from driver import METHODS, PatternDatabase, Search_limit_exception, Solver, State, make_solver, pack_board
+
+
+FIELDS = ['index', 'board', 'method', 'status', 'path_to_goal', 'cost_of_path', 'nodes_expanded', 'search_depth',
+	'max_search_depth', 'running_time', 'max_ram_usage', 'check_time']
+
+# Solver settings of the worker process, set once by init_worker
+worker_options = None
+
+
+def init_worker(options):
+	global worker_options
+	worker_options = options
+	# Map the pattern database once per worker instead of once per board
+	worker_options['heuristic'] = make_solver(options['pdb'], options['linear_conflict']).heuristic
+
+
+def solve_board(job):
+	'''
+	Solve one board in a worker process and return its result record
+	'''
+	index, line = job
+	options = worker_options
+	result = dict((field, None) for field in FIELDS)
+	result.update(index = index, board = line, method = options['method'])
+	start_time = time.time()
+	try:
+		board = [int(x) for x in line.split(',')]
+		state = pack_board(board) if options['packed'] else State(board)
+		heuristic = options['heuristic']
+		if isinstance(heuristic, PatternDatabase) and heuristic.size != state.size:
+			raise ValueError('the pattern database is for a %dx%d board' % (heuristic.size, heuristic.size))
+		solver = Solver(heuristic, options['node_limit'], options['time_limit'])
+		try:
+			result['status'] = solver.solve(options['method'], state)
+		except Search_limit_exception:
+			result['status'] = 'limit'
+		result.update(path_to_goal = solver.path, cost_of_path = len(solver.path), nodes_expanded = solver.nodes_expanded,
+			search_depth = solver.search_depth, max_search_depth = solver.max_search_depth, check_time = solver.check_time)
+	except ValueError as error:
+		result['status'] = 'error: %s' % error
+	result['running_time'] = time.time() - start_time
+	result['max_ram_usage'] = float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1000000
+	return result
+
+
+def read_boards(path):
+	'''
+	Yield (line number, board) for every non-empty line of the boards file
+	'''
+	with open(path) as boards_file:
+		for index, line in enumerate(boards_file):
+			line = line.strip()
+			if line:
+				yield index, line
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Solve a file of N-puzzle boards in parallel')
+	# hda spawns its own worker processes, which the daemonic pool workers are not allowed to do
+	parser.add_argument('method', choices = sorted(method for method in METHODS if method != 'hda'))
+	parser.add_argument('boards', help = 'file with one comma-separated board per line')
+	parser.add_argument('--workers', type = int, default = multiprocessing.cpu_count(), help = 'number of worker processes')
+	parser.add_argument('--chunk-size', type = int, default = 1, help = 'boards handed to a worker at a time')
+	parser.add_argument('--node-limit', type = int, help = 'give up on a board after expanding this many nodes')
+	parser.add_argument('--time-limit', type = float, help = 'give up on a board after this many seconds')
+	parser.add_argument('--format', choices = ['json', 'csv'], default = 'json')
+	parser.add_argument('--output', help = 'write results to this file instead of standard output')
+	parser.add_argument('--packed', action = 'store_true', help = 'store each board as a packed integer instead of a list')
+	parser.add_argument('--pdb', help = 'pattern database file used as the heuristic for ast and ida')
+	parser.add_argument('--linear-conflict', action = 'store_true', help = 'add linear conflicts to the manhattan distance')
+	args = parser.parse_args()
+
+	options = {
+		'method': args.method,
+		'packed': args.packed,
+		'pdb': args.pdb,
+		'linear_conflict': args.linear_conflict,
+		'node_limit': args.node_limit,
+		'time_limit': args.time_limit,
+	}
+	output_file = open(args.output, 'w') if args.output else sys.stdout
+	if args.format == 'csv':
+		writer = csv.writer(output_file)
+		writer.writerow(FIELDS)
+
+	pool = multiprocessing.Pool(args.workers, init_worker, (options,))
+	try:
+		for result in pool.imap_unordered(solve_board, read_boards(args.boards), args.chunk_size):
+			if args.format == 'csv':
+				path = result['path_to_goal']
+				result['path_to_goal'] = ' '.join(path) if path is not None else None
+				writer.writerow([result[field] for field in FIELDS])
+			else:
+				output_file.write(json.dumps(result, sort_keys = True) + '\n')
+			output_file.flush()
+	finally:
+		pool.terminate()
+		pool.join()
+		if output_file is not sys.stdout:
+			output_file.close()
+
+
+if __name__ == '__main__':
+	main()
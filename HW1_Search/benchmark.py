@@ -0,0 +1,334 @@
+'''
+Sheng Zhang
+HW1 | Search Algorithm: N-Puzzle -- benchmarks for the solvers, the board representations and the A* priority queue
+
+Usage: python benchmark.py                         compare the list and packed board encodings
+       python benchmark.py pq [count]              push and pop count states through Priority_Queue
+       python benchmark.py corpus [--seed S]       regenerate the fixed corpus of boards in benchmark_corpus.json
+       python benchmark.py suite <results file>    run every method over the corpus and save the measurements
+       python benchmark.py compare <old> <new>     flag regressions of a suite run against an earlier one
+
+The corpus holds seeded random solvable 8-puzzle boards bucketed by optimal depth. A suite run solves every board
+with every method in a fresh child interpreter, which does the warmup runs first and then the timed repeats, so the
+peak RSS of a record belongs to that board and method alone.
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+
+from driver import METHODS, State, Solver, Priority_Queue, Search_limit_exception, is_solvable, pack_board
+
+
+# The board behind the sample outputs in bfs_ex.txt and dfs_ex.txt
+EXAMPLE_BOARDS = [
+	('bfs_ex.txt', 'bfs', '1,2,5,3,4,0,6,7,8'),
+	('dfs_ex.txt', 'dfs', '1,2,5,3,4,0,6,7,8'),
+]
+
+ENCODINGS = ['list', 'packed']
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_corpus.json')
+
+# Optimal depths of the corpus buckets; 31 is the deepest 8-puzzle board
+DEPTH_BUCKETS = ((0, 9), (10, 14), (15, 19), (20, 24), (25, 31))
+
+# Measurements compared between two suite runs; a larger value is worse
+COMPARED_FIELDS = ('nodes_expanded', 'median_time', 'peak_rss_kb')
+
+
+def run_once(method, board, encoding, warmup = 0, repeats = 1, time_limit = None):
+	'''
+	Solve one board warmup + repeats times and return the solver statistics of the timed repeats. Peak RSS is only
+	meaningful when this runs in a fresh process.
+	'''
+	board = [int(x) for x in board.split(',')]
+	times = []
+	status = 'solved'
+	for run in range(warmup + repeats):
+		if encoding == 'packed':
+			state = pack_board(board)
+		else:
+			state = State(board)
+		solver = Solver(time_limit = time_limit, instrumented = False)
+		start_time = time.time()
+		try:
+			if not getattr(solver, METHODS[method])(state):
+				status = 'no_solution'
+		except Search_limit_exception:
+			status = 'limit'
+		elapsed = time.time() - start_time
+		if run >= warmup:
+			times.append(elapsed)
+		if status == 'limit':
+			break
+	times.sort()
+	median = times[len(times) // 2]
+	return {
+		'method': method,
+		'encoding': encoding,
+		'status': status,
+		'cost_of_path': len(solver.path),
+		'nodes_expanded': solver.nodes_expanded,
+		'running_time': times[0],
+		'times': times,
+		'median_time': median,
+		'nodes_per_second': solver.nodes_expanded / median if median > 0 else 0.0,
+		'peak_rss_kb': max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+			resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss),
+	}
+
+
+def run_isolated(method, board, encoding, warmup = 0, repeats = 1, time_limit = None):
+	'''
+	Run a single benchmark in a child interpreter so that its peak RSS is not polluted by earlier runs
+	'''
+	command = [sys.executable, os.path.abspath(__file__), '--child', method, board, encoding, str(warmup), str(repeats)]
+	if time_limit is not None:
+		command.append(str(time_limit))
+	output = subprocess.check_output(command)
+	return json.loads(output.decode('utf-8'))
+
+
+def bench_priority_queue(count, seed = 0):
+	'''
+	Push count packed 15-puzzle states (a quarter of them pushed a second time with a better value, which exercises
+	decrease key and stale-entry skipping) and pop them all back out
+	'''
+	rng = random.Random(seed)
+	board = list(range(16))
+	rng.shuffle(board)
+	states = []
+	for _ in range(count):
+		state = pack_board(board)
+		i, j = rng.randrange(16), rng.randrange(16)
+		board[i], board[j] = board[j], board[i]
+		states.append((rng.randrange(20, 80), rng.randrange(0, 60), state))
+
+	frontier = Priority_Queue()
+	start_time = time.time()
+	for f, h, state in states:
+		frontier.push((f, state), h)
+	for f, h, state in states[::4]:
+		frontier.push((f - 10, state), h)
+	push_time = time.time() - start_time
+
+	start_time = time.time()
+	popped = 0
+	last = None
+	while frontier.size() != 0:
+		value = frontier.pop()[0]
+		assert last is None or value >= last
+		last = value
+		popped += 1
+	pop_time = time.time() - start_time
+
+	pushes = count + len(states[::4])
+	print('pushes: %d in %.3f s (%.0f/s)' % (pushes, push_time, pushes / push_time))
+	print('pops:   %d in %.3f s (%.0f/s)' % (popped, pop_time, popped / pop_time))
+
+
+def compare_encodings():
+	print('%-12s %-5s %-7s %10s %10s %14s %12s' % ('example', 'meth', 'state', 'nodes', 'time (s)', 'nodes/sec', 'peak RSS KB'))
+	for name, method, board in EXAMPLE_BOARDS:
+		for encoding in ENCODINGS:
+			result = run_isolated(method, board, encoding)
+			print('%-12s %-5s %-7s %10d %10.4f %14.1f %12d' % (name, method, encoding, result['nodes_expanded'],
+				result['running_time'], result['nodes_per_second'], result['peak_rss_kb']))
+
+
+def bucket_name(depth):
+	for low, high in DEPTH_BUCKETS:
+		if low <= depth <= high:
+			return '%d-%d' % (low, high)
+
+
+def random_board(rng):
+	'''
+	Draw a solvable 8-puzzle board: half the time a random walk of the blank from the goal, which reaches the shallow
+	buckets, otherwise a shuffle with two tiles swapped back if it has the wrong parity
+	'''
+	if rng.random() < 0.5:
+		state = State(list(range(9)))
+		for _ in range(rng.randrange(1, 40)):
+			state.make_move(rng.choice(state.available_move()))
+		return list(state.current)
+	board = list(range(9))
+	rng.shuffle(board)
+	if not is_solvable(board):
+		tiles = [i for i in range(9) if board[i] != 0]
+		board[tiles[0]], board[tiles[1]] = board[tiles[1]], board[tiles[0]]
+	return board
+
+
+def make_corpus(seed, per_bucket):
+	'''
+	Draw boards until every depth bucket holds per_bucket distinct boards, measuring optimal depths with IDA*
+	'''
+	rng = random.Random(seed)
+	buckets = dict((bucket_name(low), []) for low, _ in DEPTH_BUCKETS)
+	seen = set()
+	while any(len(boards) < per_bucket for boards in buckets.values()):
+		board = random_board(rng)
+		if tuple(board) in seen:
+			continue
+		seen.add(tuple(board))
+		solver = Solver(instrumented = False)
+		solver.ida(pack_board(board))
+		depth = len(solver.path)
+		boards = buckets[bucket_name(depth)]
+		if len(boards) < per_bucket:
+			boards.append({'board': ','.join(str(tile) for tile in board), 'depth': depth, 'bucket': bucket_name(depth)})
+	return {
+		'seed': seed,
+		'buckets': ['%d-%d' % bucket for bucket in DEPTH_BUCKETS],
+		'boards': [entry for low, _ in DEPTH_BUCKETS for entry in buckets[bucket_name(low)]],
+	}
+
+
+def run_suite(corpus, methods, encodings, warmup, repeats, time_limit, report = None):
+	'''
+	Solve every corpus board with every method and encoding, each in its own child interpreter
+	'''
+	records = []
+	for method in methods:
+		for encoding in encodings:
+			for entry in corpus['boards']:
+				result = run_isolated(method, entry['board'], encoding, warmup, repeats, time_limit)
+				result.update(board = entry['board'], depth = entry['depth'], bucket = entry['bucket'])
+				records.append(result)
+				if report is not None:
+					report(result)
+	return {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+		'corpus_seed': corpus['seed'],
+		'warmup': warmup,
+		'repeats': repeats,
+		'time_limit': time_limit,
+		'records': records,
+	}
+
+
+def compare_runs(old, new, threshold, min_time):
+	'''
+	Pair the records of two suite runs by method, encoding and board, and return one line per method, encoding and
+	bucket summing each compared field, plus the list of regressions: a field of a record that grew by more than
+	threshold (a fraction), a record solved before and not any more, or a different path cost. Times that grew by
+	less than min_time seconds are timer noise and never count as regressions.
+	'''
+	old_records = dict(((r['method'], r['encoding'], r['board']), r) for r in old['records'])
+	totals = {}
+	regressions = []
+	for record in new['records']:
+		key = (record['method'], record['encoding'], record['board'])
+		before = old_records.get(key)
+		if before is None:
+			continue
+		group = totals.setdefault((record['method'], record['encoding'], record['bucket']),
+			dict((field, [0, 0]) for field in COMPARED_FIELDS))
+		for field in COMPARED_FIELDS:
+			group[field][0] += before[field]
+			group[field][1] += record[field]
+			if field == 'median_time' and record[field] - before[field] < min_time:
+				continue
+			if before['status'] == 'solved' and record[field] > before[field] * (1 + threshold):
+				regressions.append('%s %s %s: %s %s -> %s' % (key + (field, before[field], record[field])))
+		if before['status'] == 'solved' and record['status'] != 'solved':
+			regressions.append('%s %s %s: status %s -> %s' % (key + (before['status'], record['status'])))
+		elif before['status'] == 'solved' and record['cost_of_path'] != before['cost_of_path']:
+			regressions.append('%s %s %s: cost_of_path %d -> %d' % (key + (before['cost_of_path'], record['cost_of_path'])))
+	return totals, regressions
+
+
+def main():
+	if len(sys.argv) >= 5 and sys.argv[1] == '--child':
+		args = sys.argv[2:5] + [int(x) for x in sys.argv[5:7]] + [float(x) for x in sys.argv[7:8]]
+		print(json.dumps(run_once(*args)))
+		return
+	if len(sys.argv) == 1:
+		compare_encodings()
+		return
+
+	parser = argparse.ArgumentParser(description = 'Benchmarks for the N-puzzle solvers')
+	commands = parser.add_subparsers(dest = 'command')
+	pq = commands.add_parser('pq', help = 'push and pop states through Priority_Queue')
+	pq.add_argument('count', type = int, nargs = '?', default = 1000000)
+	corpus = commands.add_parser('corpus', help = 'regenerate the fixed corpus of boards')
+	corpus.add_argument('--seed', type = int, default = 2017)
+	corpus.add_argument('--per-bucket', type = int, default = 4, help = 'boards in each depth bucket')
+	corpus.add_argument('--output', default = CORPUS_FILE)
+	suite = commands.add_parser('suite', help = 'run the methods over the corpus and save the measurements')
+	suite.add_argument('results', help = 'JSON file the measurements are written to')
+	suite.add_argument('--corpus', default = CORPUS_FILE)
+	suite.add_argument('--methods', default = ','.join(sorted(METHODS)), help = 'comma-separated methods to run')
+	suite.add_argument('--encodings', default = 'list', help = 'comma-separated board encodings (list, packed)')
+	suite.add_argument('--buckets', help = 'comma-separated depth buckets to run, e.g. 0-9,10-14 (default all)')
+	suite.add_argument('--warmup', type = int, default = 1, help = 'untimed runs before the timed ones')
+	suite.add_argument('--repeats', type = int, default = 3, help = 'timed runs; the median time is reported')
+	suite.add_argument('--time-limit', type = float, default = 60, help = 'give up on a run after this many seconds')
+	compare = commands.add_parser('compare', help = 'flag regressions between two suite runs')
+	compare.add_argument('old')
+	compare.add_argument('new')
+	compare.add_argument('--threshold', type = float, default = 0.1, help = 'allowed growth of a measurement, as a fraction')
+	compare.add_argument('--min-time', type = float, default = 0.01, help = 'smallest slowdown in seconds that is reported')
+	args = parser.parse_args()
+
+	if args.command == 'pq':
+		bench_priority_queue(args.count)
+
+	elif args.command == 'corpus':
+		with open(args.output, 'w') as corpus_file:
+			json.dump(make_corpus(args.seed, args.per_bucket), corpus_file, indent = 1, separators = (',', ': '), sort_keys = True)
+			corpus_file.write('\n')
+
+	elif args.command == 'suite':
+		with open(args.corpus) as corpus_file:
+			corpus = json.load(corpus_file)
+		if args.buckets:
+			corpus['boards'] = [entry for entry in corpus['boards'] if entry['bucket'] in args.buckets.split(',')]
+		methods = args.methods.split(',')
+		for method in methods:
+			if method not in METHODS:
+				parser.error('unknown method %s' % method)
+
+		def report(result):
+			print('%-5s %-7s %-6s %-18s %-11s %10d %10.4f %14.1f %12d' % (result['method'], result['encoding'],
+				result['bucket'], result['board'], result['status'], result['nodes_expanded'], result['median_time'],
+				result['nodes_per_second'], result['peak_rss_kb']))
+			sys.stdout.flush()
+
+		print('%-5s %-7s %-6s %-18s %-11s %10s %10s %14s %12s' % ('meth', 'state', 'depth', 'board', 'status', 'nodes',
+			'median (s)', 'nodes/sec', 'peak RSS KB'))
+		results = run_suite(corpus, methods, args.encodings.split(','), args.warmup, args.repeats, args.time_limit, report)
+		with open(args.results, 'w') as results_file:
+			json.dump(results, results_file, indent = 1, separators = (',', ': '), sort_keys = True)
+			results_file.write('\n')
+
+	else:
+		with open(args.old) as old_file:
+			old = json.load(old_file)
+		with open(args.new) as new_file:
+			new = json.load(new_file)
+		totals, regressions = compare_runs(old, new, args.threshold, args.min_time)
+		print('%-5s %-7s %-6s %21s %21s %21s' % (('meth', 'state', 'depth') + COMPARED_FIELDS))
+		for method, encoding, bucket in sorted(totals):
+			group = totals[(method, encoding, bucket)]
+			print('%-5s %-7s %-6s' % (method, encoding, bucket) + ''.join(' %10.4g %+9.1f%%' % (
+				group[field][1], 100.0 * (group[field][1] - group[field][0]) / group[field][0] if group[field][0] else 0.0)
+				for field in COMPARED_FIELDS))
+		for regression in regressions:
+			print('REGRESSION ' + regression)
+		if regressions:
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,132 @@
+'''
+Sheng Zhang
+HW1 | Search Algorithm: N-Puzzle -- precomputed 8-puzzle distance oracle
+
+Usage: python distance_oracle.py build <oracle file>
+       python distance_oracle.py query <oracle file> <board>
+
+The oracle holds one byte per permutation of the 3x3 board, indexed by the permutation rank (Lehmer code):
+(optimal distance << 2) | index of the best move, or 255 for the unreachable parity class. It is built once by a
+breadth-first search backwards from the goal and queried through mmap, so answering a board is a walk of at most
+31 table lookups with no search.
+'''
+
+import sys
+import math
+import mmap
+import time
+import argparse
+
+from driver import MOVE_NAMES, move_table, packed_layout
+
+
+SIZE = 3
+UNREACHABLE = 255
+FACTORIALS = [math.factorial(i) for i in range(SIZE * SIZE)]
+
+
+def permutation_rank(board):
+	'''
+	Return the Lehmer code of a board: its index among all permutations of its tiles in lexicographic order
+	'''
+	n = len(board)
+	rank = 0
+	for i in range(n - 1):
+		smaller = 0
+		for j in range(i + 1, n):
+			if board[j] < board[i]:
+				smaller += 1
+		rank += smaller * FACTORIALS[n - 1 - i]
+	return rank
+
+
+def build_oracle():
+	'''
+	Breadth-first search from the goal. A board first reached from its parent by moving the blank one way is solved
+	optimally by moving the blank back, so that opposite move is stored as the best move.
+	'''
+	n = SIZE * SIZE
+	moves = move_table(packed_layout(SIZE))
+	table = bytearray([UNREACHABLE]) * math.factorial(n)
+	goal = list(range(n))
+	table[permutation_rank(goal)] = 0
+	layer = [goal]
+	distance = 0
+	while layer:
+		distance += 1
+		next_layer = []
+		for board in layer:
+			zero_loc = board.index(0)
+			for move, loc in moves[zero_loc]:
+				child = list(board)
+				child[zero_loc] = child[loc]
+				child[loc] = 0
+				rank = permutation_rank(child)
+				if table[rank] == UNREACHABLE:
+					table[rank] = (distance << 2) | (move ^ 1)
+					next_layer.append(child)
+		layer = next_layer
+	return table
+
+
+def load_oracle(path):
+	with open(path, 'rb') as oracle_file:
+		return mmap.mmap(oracle_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+
+def query(oracle, board):
+	'''
+	Return the optimal list of moves for a board, or None if the board cannot reach the goal
+	'''
+	board = list(board)
+	rank = permutation_rank(board)
+	entry = ord(oracle[rank:rank + 1])
+	if entry == UNREACHABLE:
+		return None
+	offsets = (-SIZE, SIZE, -1, 1)
+	path = []
+	zero_loc = board.index(0)
+	while entry >> 2 != 0:
+		move = entry & 3
+		loc = zero_loc + offsets[move]
+		board[zero_loc] = board[loc]
+		board[loc] = 0
+		zero_loc = loc
+		path.append(MOVE_NAMES[move])
+		rank = permutation_rank(board)
+		entry = ord(oracle[rank:rank + 1])
+	return path
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Build or query the 8-puzzle distance oracle')
+	parser.add_argument('command', choices = ['build', 'query'])
+	parser.add_argument('oracle', help = 'oracle file')
+	parser.add_argument('board', nargs = '?', help = 'board to answer (query only)')
+	args = parser.parse_args()
+
+	if args.command == 'build':
+		table = build_oracle()
+		with open(args.oracle, 'wb') as oracle_file:
+			oracle_file.write(table)
+		return
+
+	if args.board is None:
+		parser.error('query needs a board')
+	board = [int(x) for x in args.board.split(',')]
+	if len(board) != SIZE * SIZE:
+		parser.error('the oracle answers %dx%d boards only' % (SIZE, SIZE))
+	oracle = load_oracle(args.oracle)
+	start_time = time.time()
+	path = query(oracle, board)
+	run_time = time.time() - start_time
+	if path is None:
+		sys.stdout.write('result: unsolvable\n')
+	else:
+		sys.stdout.write('path_to_goal: %s\n' % path)
+		sys.stdout.write('cost_of_path: %d\n' % len(path))
+	sys.stdout.write('running_time: %.8f\n' % run_time)
+
+
+if __name__ == '__main__':
+	main()
@@ -9,22 +9,148 @@ import time
 import resource
 import copy
 import heapq
+import argparse
+import json
+import itertools
+import multiprocessing
+from collections import deque
+from Queue import Empty
+
+from pattern_database import PatternDatabase, load_pattern_database
 
 
 def manhattan_distance(state):
 	'''
 	Calculate the manhattan distance toward the goal state
 	'''
-	horiz = []
-	vert = []
-	for i in state.current:
-		if i != 0:
-			horiz.append(abs(state.current.index(i)%3 - i%3))
-			vert.append(abs(state.current.index(i)/3 - i/3))			
-	m_dist = sum(horiz + vert)
+	table = manhattan_table(state.size)
+	m_dist = 0
+	for loc, tile in enumerate(state.current):
+		m_dist += table[tile][loc]
 	return m_dist
 
 
+def make_solver(pdb = None, linear_conflict = False, node_limit = None, time_limit = None, metrics = None, instrumented = True):
+	'''
+	Create a Solver with the heuristic selected on the command line: a pattern database file, manhattan distance plus
+	linear conflict, or plain manhattan distance
+	'''
+	if pdb:
+		heuristic = load_pattern_database(pdb)
+	elif linear_conflict:
+		heuristic = manhattan_linear_conflict
+	else:
+		heuristic = manhattan_distance
+	return Solver(heuristic, node_limit, time_limit, metrics, instrumented)
+
+
+def manhattan_linear_conflict(state):
+	'''
+	Calculate the manhattan distance plus the linear conflicts of every row and column
+	'''
+	return manhattan_distance(state) + linear_conflict(state.current, state.size)
+
+
+_manhattan_tables = {}
+
+
+def manhattan_table(size):
+	'''
+	Return (and cache) table[tile][position]: the manhattan distance of a tile at a position from its goal position
+	'''
+	table = _manhattan_tables.get(size)
+	if table is None:
+		n = size * size
+		table = [[0] * n]
+		for tile in range(1, n):
+			table.append([abs(loc // size - tile // size) + abs(loc % size - tile % size) for loc in range(n)])
+		_manhattan_tables[size] = table
+	return table
+
+
+def manhattan_database(size):
+	'''
+	Express the manhattan distance as a pattern database with one single-tile pattern per tile, so that the
+	iterative-deepening search updates either heuristic the same way
+	'''
+	table = manhattan_table(size)
+	patterns = [(tile,) for tile in range(1, size * size)]
+	return PatternDatabase(size, patterns, [bytes(bytearray(table[tile])) for tile in range(1, size * size)])
+
+
+_line_conflicts = {}
+
+
+def line_conflict(goals):
+	'''
+	Return the linear conflict of a line given the goal coordinates (in line order) of the tiles that belong to it:
+	two moves for every tile that has to leave the line so that the remaining tiles are in goal order.
+	Memoized per tuple of goal coordinates.
+	'''
+	value = _line_conflicts.get(goals)
+	if value is None:
+		longest = []
+		for i in range(len(goals)):
+			longest.append(1 + max([longest[j] for j in range(i) if goals[j] < goals[i]] or [0]))
+		value = 2 * (len(goals) - max(longest or [0]))
+		_line_conflicts[goals] = value
+	return value
+
+
+def row_conflict(board, size, row):
+	return line_conflict(tuple(tile % size for tile in board[row * size:(row + 1) * size] if tile != 0 and tile // size == row))
+
+
+def column_conflict(board, size, column):
+	return line_conflict(tuple(tile // size for tile in board[column::size] if tile != 0 and tile % size == column))
+
+
+def linear_conflict(board, size):
+	'''
+	Sum the linear conflicts of all rows and columns
+	'''
+	return sum(row_conflict(board, size, i) + column_conflict(board, size, i) for i in range(size))
+
+
+def moved_lines_conflict(board, size, loc, zero_loc):
+	'''
+	Sum the linear conflicts of the two lines a tile leaves and enters when it slides between loc and zero_loc:
+	rows for a vertical move, columns for a horizontal one. The order within the other line is unchanged.
+	'''
+	if loc % size == zero_loc % size:
+		return row_conflict(board, size, loc // size) + row_conflict(board, size, zero_loc // size)
+	return column_conflict(board, size, loc % size) + column_conflict(board, size, zero_loc % size)
+
+
+def heuristic_delta(parent, child, size, loc, zero_loc, linear = False):
+	'''
+	Return the change of the heuristic when the tile at loc of the parent board slides into the blank at zero_loc
+	'''
+	tile = parent[loc]
+	table = manhattan_table(size)
+	delta = table[tile][zero_loc] - table[tile][loc]
+	if linear:
+		delta += moved_lines_conflict(child, size, loc, zero_loc) - moved_lines_conflict(parent, size, loc, zero_loc)
+	return delta
+
+
+def is_solvable(board):
+	'''
+	Check whether the goal can be reached from a board. For odd widths the number of inversions must be even; for even
+	widths the inversions plus the row distance of the blank from the top row must be even.
+	'''
+	size = int(math.sqrt(len(board)))
+	tiles = [tile for tile in board if tile != 0]
+	inversions = 0
+	for i in range(len(tiles)):
+		for j in range(i + 1, len(tiles)):
+			if tiles[i] > tiles[j]:
+				inversions += 1
+	if size % 2 == 1:
+		return inversions % 2 == 0
+	return (inversions + board.index(0) // size) % 2 == 0
+
+
 class State:
 	'''
 	Represent a state of the board
@@ -36,6 +162,16 @@ class State:
 		self.depth = depth
 		self.size = int(math.sqrt(len(self.current)))
 		self.zero_loc = self.current.index(0)
+		self.h = None
+		self.linear_conflict = False
+
+	def track_heuristic(self, linear = False):
+		'''
+		Compute the manhattan distance (plus linear conflict if requested) once; successors then carry the value
+		forward and update it from the single tile that moves
+		'''
+		self.linear_conflict = linear
+		self.h = manhattan_linear_conflict(self) if linear else manhattan_distance(self)
 
 	def __str__(self):
 		return(str(self.current))
@@ -60,7 +196,7 @@ class State:
 			moves.append('Down')
 		if self.zero_loc % self.size != 0:
 			moves.append('Left')
-		if self.zero_loc % self.size != 2:
+		if self.zero_loc % self.size != (self.size - 1):
 			moves.append('Right')
 		return moves
 
@@ -94,21 +230,20 @@ class State:
 		for move in moves:
 			temp_board = copy.copy(self.current)  # Want to create a shallow copy of the current board
 			if move == 'Up':
-				temp_board[self.zero_loc] = self.current[self.zero_loc - self.size]
-				temp_board[self.zero_loc - self.size] = 0
-				successors.append(State(temp_board, self, move, self.depth + 1))
+				loc = self.zero_loc - self.size
 			elif move == 'Down':
-				temp_board[self.zero_loc] = self.current[self.zero_loc + self.size]
-				temp_board[self.zero_loc + self.size] = 0
-				successors.append(State(temp_board, self, move, self.depth + 1))
+				loc = self.zero_loc + self.size
 			elif move == 'Left':
-				temp_board[self.zero_loc] = self.current[self.zero_loc - 1]
-				temp_board[self.zero_loc - 1] = 0
-				successors.append(State(temp_board, self, move, self.depth + 1))
+				loc = self.zero_loc - 1
 			elif move == 'Right':
-				temp_board[self.zero_loc] = self.current[self.zero_loc + 1]
-				temp_board[self.zero_loc + 1] = 0
-				successors.append(State(temp_board, self, move, self.depth + 1))
+				loc = self.zero_loc + 1
+			temp_board[self.zero_loc] = self.current[loc]
+			temp_board[loc] = 0
+			child = State(temp_board, self, move, self.depth + 1)
+			if self.h is not None:
+				child.linear_conflict = self.linear_conflict
+				child.h = self.h + heuristic_delta(self.current, temp_board, self.size, loc, self.zero_loc, self.linear_conflict)
+			successors.append(child)
 		return successors
 
 	def __repr__(self):
@@ -130,20 +265,193 @@ class State:
 		return hash(str(self.current))
 
 
+_packed_layouts = {}
+
+
+def packed_layout(size):
+	'''
+	Return the lookup tables used by PackedState for a size x size board: bits per tile, tile mask, goal key,
+	and the (move, tile position) pairs available for every position of the blank. Built once per board size.
+	'''
+	layout = _packed_layouts.get(size)
+	if layout is None:
+		n = size * size
+		bits = max(4, (n - 1).bit_length())
+		goal = 0
+		for i in range(n):
+			goal |= i << (i * bits)
+		neighbours = []
+		for loc in range(n):
+			moves = []
+			if loc > (size - 1):
+				moves.append(('Up', loc - size))
+			if loc < (size * (size - 1)):
+				moves.append(('Down', loc + size))
+			if loc % size != 0:
+				moves.append(('Left', loc - 1))
+			if loc % size != (size - 1):
+				moves.append(('Right', loc + 1))
+			neighbours.append(tuple(moves))
+		layout = (size, bits, (1 << bits) - 1, goal, tuple(neighbours))
+		_packed_layouts[size] = layout
+	return layout
+
+
+def pack_board(board):
+	'''
+	Encode a board (list of tiles) as a PackedState
+	'''
+	layout = packed_layout(int(math.sqrt(len(board))))
+	bits = layout[1]
+	key = 0
+	for i in range(len(board)):
+		key |= board[i] << (i * bits)
+	return PackedState(key, board.index(0), layout)
+
+
+MOVE_NAMES = ('Up', 'Down', 'Left', 'Right')
+ROOT_MOVE = len(MOVE_NAMES)
+
+
+def move_table(layout):
+	'''
+	Return, for every position of the blank, the (move index, tile position) pairs of a packed layout
+	'''
+	return [tuple((MOVE_NAMES.index(move), loc) for move, loc in moves) for moves in layout[4]]
+
+
+def unwind_parent_map(parents, key, layout):
+	'''
+	Rebuild the list of moves leading to key from a parent map of packed keys. Each entry stores
+	(blank position << 3) | move index, and the parent key is recovered by undoing that move.
+	'''
+	size, bits, mask = layout[:3]
+	offsets = (-size, size, -1, 1)
+	path = []
+	entry = parents[key]
+	while entry & 7 != ROOT_MOVE:
+		move = entry & 7
+		zero_loc = entry >> 3
+		parent_zero = zero_loc - offsets[move]
+		tile = (key >> (parent_zero * bits)) & mask
+		key += (tile << (zero_loc * bits)) - (tile << (parent_zero * bits))
+		path.append(MOVE_NAMES[move])
+		entry = parents[key]
+	path.reverse()
+	return path
+
+
+def invert_path(path):
+	'''
+	Return the moves that walk a path backwards: reversed order, each move replaced by its opposite
+	'''
+	return [MOVE_NAMES[MOVE_NAMES.index(move) ^ 1] for move in reversed(path)]
+
+
+class PackedState(object):
+	'''
+	Represent a state of the board as a single integer holding a fixed number of bits per tile.
+	Exposes the same interface as State, so the search algorithms run on either representation.
+	'''
+	__slots__ = ('key', 'zero_loc', 'layout', 'previous', 'move', 'depth')
+
+	def __init__(self, key, zero_loc, layout, previous = None, move = None, depth = 0):
+		self.key = key
+		self.zero_loc = zero_loc
+		self.layout = layout
+		self.previous = previous
+		self.move = move
+		self.depth = depth
+
+	@property
+	def size(self):
+		return self.layout[0]
+
+	@property
+	def current(self):
+		'''
+		Decode the board into a list of tiles
+		'''
+		size, bits, mask = self.layout[:3]
+		return [(self.key >> (i * bits)) & mask for i in range(size * size)]
+
+	def __str__(self):
+		return(str(self.current))
+
+	def is_goalstate(self):
+		'''
+		Check if the current state is the goal state
+		'''
+		return self.key == self.layout[3]
+
+	def available_move(self):
+		'''
+		Return a list of legitimate moves
+		'''
+		return [move for move, _ in self.layout[4][self.zero_loc]]
+
+	def make_move(self, move):
+		'''
+		Change the board according to a move
+		'''
+		bits, mask = self.layout[1:3]
+		for name, loc in self.layout[4][self.zero_loc]:
+			if name == move:
+				tile = (self.key >> (loc * bits)) & mask
+				self.key += (tile << (self.zero_loc * bits)) - (tile << (loc * bits))
+				self.zero_loc = loc
+				return
+
+	def get_successors(self):
+		'''
+		Return a list of states that are the result of making actions. Each successor only moves one tile, so it
+		is derived from the parent key with two shifts instead of copying the board.
+		'''
+		layout = self.layout
+		bits, mask = layout[1:3]
+		key = self.key
+		zero_shift = self.zero_loc * bits
+		depth = self.depth + 1
+		successors = []
+		for move, loc in layout[4][self.zero_loc]:
+			shift = loc * bits
+			tile = (key >> shift) & mask
+			successors.append(PackedState(key + (tile << zero_shift) - (tile << shift), loc, layout, self, move, depth))
+		return successors
+
+	def __repr__(self):
+		return str(self.current)
+
+	def __eq__(self, other):
+		if isinstance(other, PackedState):
+			return self.key == other.key
+		else:
+			return False
+
+	def __ne__(self, other):
+		if isinstance(other, PackedState):
+			return self.key != other.key
+		else:
+			return True
+
+	def __hash__(self):
+		return hash(self.key)
+
+
 class Queue:
 	'''
 	Define an efficient queue implementation, adapted from http://interactivepython.org/courselib/static/pythonds/BasicDS/ImplementingaQueueinPython.html
 	'''
 	def __init__(self):
-		self.items = []
+		self.items = deque()
 		self.q_set = set()
 
 	def enqueue(self, item):
-		self.items.insert(0, item)
+		self.items.append(item)
 		self.q_set.add(item)
 
 	def dequeue(self):
-		rm_item = self.items.pop()
+		rm_item = self.items.popleft()
 		self.q_set.remove(rm_item)
 		return rm_item
 
@@ -174,55 +482,345 @@ class Stack:
 
 class Priority_Queue:
 	'''
-	Define an efficient priority queue implementation
+	Define an efficient priority queue implementation: a binary heap with lazy deletion. Every item keeps a single
+	live heap entry; "decrease key" pushes a new entry and leaves the old one behind to be skipped when it is popped.
+	Ties on the value are broken by the tie breaker (h for A*) and then by insertion order, so pops are deterministic.
 	'''
 	def __init__(self):
 		self.items = []
-		self.p_set = set()
+		self.entries = {}
+		self.counter = 0
 
-	def push(self, value_key_pair):
+	def push(self, value_key_pair, tie_breaker = 0):
 		'''
-		Push a new value-key pair (tuple) into the priority queue and perform "decrease key" if the item is already in the priority queue
+		Push a new value-key pair (tuple) into the priority queue and perform "decrease key" if the item is already in the priority queue.
+		Return True if the item was added or its value decreased, False if the queued entry was already at least as good.
 		'''
-		if value_key_pair[1] not in self.p_set:
-			heapq.heappush(self.items, value_key_pair)
-			self.p_set.add(value_key_pair[1])
-		else:
-			min_value = value_key_pair[0]
-			for pair in self.items:
-				if pair[1] == value_key_pair[1]:
-					if min_value > pair[0]:
-						min_value = pair[0]
-					pair[0] = -1  # Make sure to pop out the ones that are repeating
-					heapq.heappop(self.items)
-			heapq.heappush(self.items, (min_value, value_key_pair[1]))
+		value, key = value_key_pair
+		entry = self.entries.get(key)
+		if entry is not None and entry[:2] <= (value, tie_breaker):
+			return False
+		entry = (value, tie_breaker, self.counter, key)
+		self.counter += 1
+		self.entries[key] = entry
+		heapq.heappush(self.items, entry)
+		return True
 
 	def pop(self):
-		rm_item = heapq.heappop(self.items)
-		self.p_set.remove(rm_item[1])
-		return rm_item
+		'''
+		Pop the value-key pair with the lowest value, skipping entries that have been superseded by a decrease key
+		'''
+		while True:
+			entry = heapq.heappop(self.items)
+			if self.entries.get(entry[3]) is entry:
+				del self.entries[entry[3]]
+				return (entry[0], entry[3])
 
 	def size(self):
-		return len(self.items)
+		return len(self.entries)
+
+	def __contains__(self, key):
+		return key in self.entries
+
+
+# Cost bound of a hash-distributed A* search before any worker has reached the goal
+NO_INCUMBENT = 1 << 30
+
+
+def hda_owner(key, workers):
+	'''
+	Return the worker that owns a packed state in hash-distributed A*. Reducing by a large prime first mixes every
+	tile into the result, so states spread evenly even for a power-of-two number of workers.
+	'''
+	return (key % 2147483647) % workers
+
+
+def hda_worker(index, workers, layout, heuristic, inboxes, results, incumbent, shared, done):
+	'''
+	One worker of hash-distributed A*. It keeps the open list and best-g map of the states it owns, expands them in
+	rounds of up to 256 nodes, and sends children owned by other workers to their inboxes in one batch per worker and
+	round. A reached goal lowers the shared incumbent cost, and nodes with f >= incumbent are pruned. Once the search
+	is done the worker answers parent lookups for the path until it is told to stop.
+	'''
+	moves = move_table(layout)
+	goal = layout[3]
+	bits, mask = layout[1:3]
+	inbox = inboxes[index]
+	open_list = []
+	best = {}
+	outboxes = [[] for _ in range(workers)]
+	counter = itertools.count()
+	expansions = 0
+	max_depth = 0
+
+	def add(key, g, entry):
+		known = best.get(key)
+		if known is None or g < known[0]:
+			best[key] = (g, entry)
+			h = heuristic(PackedState(key, entry >> 3, layout))
+			heapq.heappush(open_list, (g + h, h, next(counter), key, g))
+
+	def receive(batch):
+		# Mark the worker busy before counting the batch, so the coordinator never sees all batches received while
+		# their states sit unexpanded in an idle worker
+		shared['idle'][index] = 0
+		for key, g, entry in batch:
+			add(key, g, entry)
+		shared['received'][index] += 1
+
+	while not done.value:
+		while True:
+			try:
+				receive(inbox.get_nowait())
+			except Empty:
+				break
+
+		expanded = 0
+		while len(open_list) != 0 and expanded < 256:
+			f, h, _, key, g = heapq.heappop(open_list)
+			if best[key][0] != g:
+				continue
+			if f >= incumbent.value:
+				del open_list[:]
+				break
+			if key == goal:
+				with incumbent.get_lock():
+					if g < incumbent.value:
+						incumbent.value = g
+				continue
+			expansions += 1
+			expanded += 1
+			if g + 1 > max_depth:
+				max_depth = g + 1
+			zero_loc = best[key][1] >> 3
+			zero_shift = zero_loc * bits
+			for move, loc in moves[zero_loc]:
+				shift = loc * bits
+				tile = (key >> shift) & mask
+				child = key + (tile << zero_shift) - (tile << shift)
+				owner = hda_owner(child, workers)
+				if owner == index:
+					add(child, g + 1, (loc << 3) | move)
+				else:
+					outboxes[owner].append((child, g + 1, (loc << 3) | move))
+		shared['expansions'][index] = expansions
+
+		for owner in range(workers):
+			if len(outboxes[owner]) != 0:
+				shared['sent'][index] += 1
+				inboxes[owner].put(outboxes[owner])
+				outboxes[owner] = []
+
+		if len(open_list) == 0 or open_list[0][0] >= incumbent.value:
+			shared['idle'][index] = 1
+			try:
+				receive(inbox.get(True, 0.005))
+			except Empty:
+				pass
+
+	results.put(('stats', index, expansions, max_depth))
+	while True:
+		message = inbox.get()
+		if isinstance(message, list):
+			# A batch still in flight when the search was stopped early
+			continue
+		if message[0] == 'stop':
+			# Batches left unread after an early stop must not keep the worker from exiting
+			for queue in inboxes:
+				queue.cancel_join_thread()
+			return
+		results.put(best[message[1]][1])
+
+
+class Hda_parent_map:
+	'''
+	Look up the parent-map entries of a finished hash-distributed A* search in the workers that own the states, so
+	that unwind_parent_map can rebuild the path
+	'''
+	def __init__(self, inboxes, results):
+		self.inboxes = inboxes
+		self.results = results
+
+	def __getitem__(self, key):
+		self.inboxes[hda_owner(key, len(self.inboxes))].put(('lookup', key))
+		return self.results.get()
+
+
+class Search_metrics:
+	'''
+	Collect search statistics without a system call per expanded node. Peak RSS and nodes/sec are sampled at the
+	Solver checkpoints (every sample_every expansions), or at most once per sample_interval seconds when that is set.
+	The searches count the frontier high-water mark and duplicate hits: generated states that were already explored
+	or queued (ida keeps neither a frontier nor an explored set). An optional callback receives the metrics after
+	every sample, for live progress.
+	'''
+	def __init__(self, sample_every = 1024, sample_interval = None, callback = None):
+		self.sample_every = sample_every
+		self.sample_interval = sample_interval
+		self.callback = callback
+		self.max_frontier_size = 0
+		self.duplicate_hits = 0
+		self.samples = 0
+		self.peak_rss = 0
+		self.nodes_expanded = 0
+		self.elapsed = 0.0
+		self.last_sample = None
+
+	def sample(self, solver, start_time, now, final = False):
+		if not final and self.sample_interval is not None and self.last_sample is not None:
+			if now - self.last_sample < self.sample_interval:
+				return
+		self.last_sample = now
+		self.samples += 1
+		rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if rss > self.peak_rss:
+			self.peak_rss = rss
+		solver.max_usage = self.peak_rss
+		self.nodes_expanded = solver.nodes_expanded
+		self.elapsed = now - start_time
+		if self.callback is not None:
+			self.callback(self)
+
+	def nodes_per_second(self):
+		if self.elapsed > 0:
+			return self.nodes_expanded / self.elapsed
+		return 0.0
+
+	def as_dict(self):
+		return {
+			'nodes_expanded': self.nodes_expanded,
+			'running_time': self.elapsed,
+			'nodes_per_second': self.nodes_per_second(),
+			'max_frontier_size': self.max_frontier_size,
+			'duplicate_hits': self.duplicate_hits,
+			'peak_rss_kb': self.peak_rss,
+			'rss_samples': self.samples,
+		}
+
+
+def print_progress(metrics):
+	'''
+	Progress callback that reports the metrics on standard error
+	'''
+	sys.stderr.write('nodes_expanded: %d  nodes/sec: %.0f  max_frontier_size: %d  duplicate_hits: %d  peak_rss_kb: %d\n' % (
+		metrics.nodes_expanded, metrics.nodes_per_second(), metrics.max_frontier_size, metrics.duplicate_hits, metrics.peak_rss))
+
+
+class Search_limit_exception(Exception):
+	'''
+	Raised when a search exceeds the node or time limit of its Solver
+	'''
+	pass
+
+
+# Result codes of Solver.solve
+(SOLVED, NO_SOLUTION, UNSOLVABLE) = ('solved', 'no_solution', 'unsolvable')
+
+# Command-line method names and the Solver methods that implement them
+METHODS = {'bfs': 'bfs', 'cbfs': 'bfs_compact', 'bibfs': 'bidirectional_bfs', 'dfs': 'dfs', 'ast': 'astar', 'ida': 'ida',
+	'hda': 'hda'}
 
 
 class Solver:
 	'''
 	Define methods that implement the search algorithms, as well as variables that record some key information regarding each algorithm.
 	'''
-	def __init__(self):
+	def __init__(self, heuristic = manhattan_distance, node_limit = None, time_limit = None, metrics = None, instrumented = True):
+		self.heuristic = heuristic
+		self.node_limit = node_limit
+		self.time_limit = time_limit
+		if instrumented:
+			self.metrics = metrics if metrics is not None else Search_metrics()
+		else:
+			self.metrics = None
+		self.next_checkpoint = 0
 		self.nodes_expanded = 0
 		self.path = []
 		self.search_depth = 0
 		self.max_search_depth = 0
 		self.run_time = 0
 		self.max_usage = 0
+		self.check_time = 0
+		self.workers = multiprocessing.cpu_count()
+		self.worker_expansions = []
+
+	def solve(self, method, init_state):
+		'''
+		Run the solvability check and, only if the board can reach the goal, the search named by method (a key of METHODS).
+		Return SOLVED, NO_SOLUTION, or UNSOLVABLE when the board was rejected without searching.
+		'''
+		start_time = time.time()
+		solvable = is_solvable(init_state.current)
+		self.check_time = time.time() - start_time
+		if not solvable:
+			self.run_time = self.check_time
+			return UNSOLVABLE
+		if getattr(self, METHODS[method])(init_state):
+			return SOLVED
+		return NO_SOLUTION
+
+	def start_search(self):
+		'''
+		Start the clock of a search and schedule its first checkpoint
+		'''
+		start_time = time.time()
+		if self.metrics is not None:
+			self.metrics.last_sample = None
+		self.schedule_checkpoint()
+		return start_time
+
+	def schedule_checkpoint(self):
+		'''
+		Set the node count of the next checkpoint: every sample_every nodes when instrumented, every 256 nodes when only
+		a time limit has to be watched, and never otherwise; always no later than the node limit
+		'''
+		if self.metrics is not None:
+			self.next_checkpoint = self.nodes_expanded + self.metrics.sample_every
+		elif self.time_limit is not None:
+			self.next_checkpoint = self.nodes_expanded + 256
+		else:
+			self.next_checkpoint = float('inf')
+		if self.node_limit is not None and self.node_limit < self.next_checkpoint:
+			self.next_checkpoint = self.node_limit
+
+	def checkpoint(self, start_time):
+		'''
+		Called by the searches every few hundred expansions instead of on every node: enforce the node and time limits
+		and sample the metrics
+		'''
+		now = time.time()
+		if self.node_limit is not None and self.nodes_expanded >= self.node_limit:
+			raise Search_limit_exception('node limit of %d reached' % self.node_limit)
+		if self.time_limit is not None and now - start_time > self.time_limit:
+			raise Search_limit_exception('time limit of %g s reached' % self.time_limit)
+		if self.metrics is not None:
+			self.metrics.sample(self, start_time, now)
+		self.schedule_checkpoint()
+
+	def finish_search(self, start_time):
+		'''
+		Record the running time and take a final sample of the metrics
+		'''
+		now = time.time()
+		self.run_time = now - start_time
+		if self.metrics is not None:
+			self.metrics.sample(self, start_time, now, True)
+
+	def evaluate(self, state):
+		'''
+		Return the heuristic value of a state, reusing the value the state carries when it tracks one
+		'''
+		h = getattr(state, 'h', None)
+		if h is None:
+			h = self.heuristic(state)
+		return h
 
 	def bfs(self, init_state):
 		'''
 		Implements Breath-First Search, following the algorithm introduced in lecture
 		'''
-		start_time = time.time()
+		start_time = self.start_search()
+		metrics = self.metrics
 		frontier = Queue()
 		frontier.enqueue(init_state)
 		explored = set()
@@ -239,11 +837,13 @@ class Solver:
 				temp_path.reverse()
 				self.path = temp_path
 				self.search_depth = cur_state.depth
-				self.run_time = time.time() - start_time
+				self.finish_search(start_time)
 				return True
 
 			children = cur_state.get_successors()
 			self.nodes_expanded += 1
+			if self.nodes_expanded >= self.next_checkpoint:
+				self.checkpoint(start_time)
 			for child in children:
 				child.depth = cur_state.depth + 1
 				if child not in explored:
@@ -252,17 +852,281 @@ class Solver:
 						explored.add(child)
 						if child.depth > self.max_search_depth:
 							self.max_search_depth = child.depth
-			ram_temp = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-			if ram_temp > self.max_usage:
-				self.max_usage = ram_temp
-		self.run_time = time.time() - start_time
+				elif metrics is not None:
+					metrics.duplicate_hits += 1
+			if metrics is not None and frontier.size() > metrics.max_frontier_size:
+				metrics.max_frontier_size = frontier.size()
+		self.finish_search(start_time)
 		return False
 
+	def bfs_compact(self, init_state):
+		'''
+		Implements Breath-First Search on packed keys only: the frontier is a deque of integers and the explored set is a
+		parent map from key to (blank position, move), so no State objects or search tree are kept alive. The path is
+		rebuilt from the parent map once the goal is found.
+		'''
+		start_time = self.start_search()
+		if not isinstance(init_state, PackedState):
+			init_state = pack_board(init_state.current)
+		layout = init_state.layout
+		bits, mask, goal = layout[1:4]
+		moves = move_table(layout)
+
+		metrics = self.metrics
+		parents = {init_state.key: (init_state.zero_loc << 3) | ROOT_MOVE}
+		frontier = deque([init_state.key])
+		depth = 0
+
+		while len(frontier) != 0:
+			for _ in range(len(frontier)):
+				key = frontier.popleft()
+				if key == goal:
+					self.path = unwind_parent_map(parents, key, layout)
+					self.search_depth = depth
+					self.finish_search(start_time)
+					return True
+
+				zero_loc = parents[key] >> 3
+				zero_shift = zero_loc * bits
+				self.nodes_expanded += 1
+				if self.nodes_expanded >= self.next_checkpoint:
+					self.checkpoint(start_time)
+				for move, loc in moves[zero_loc]:
+					shift = loc * bits
+					tile = (key >> shift) & mask
+					child = key + (tile << zero_shift) - (tile << shift)
+					if child not in parents:
+						parents[child] = (loc << 3) | move
+						frontier.append(child)
+						self.max_search_depth = depth + 1
+					elif metrics is not None:
+						metrics.duplicate_hits += 1
+			depth += 1
+			if metrics is not None and len(frontier) > metrics.max_frontier_size:
+				metrics.max_frontier_size = len(frontier)
+		self.finish_search(start_time)
+		return False
+
+	def bidirectional_bfs(self, init_state):
+		'''
+		Implements bidirectional Breath-First Search on packed keys: one search grows from the board and one from the goal,
+		always expanding a full layer of the side with the smaller frontier. Once a layer reaches states already seen by
+		the other side, the shortest joined path is stitched together from the two parent maps. Unsolvable boards are
+		rejected by the parity check before any search.
+		'''
+		start_time = self.start_search()
+		if not is_solvable(init_state.current):
+			self.finish_search(start_time)
+			return False
+		if not isinstance(init_state, PackedState):
+			init_state = pack_board(init_state.current)
+		layout = init_state.layout
+		bits, mask, goal = layout[1:4]
+		moves = move_table(layout)
+		if init_state.key == goal:
+			self.finish_search(start_time)
+			return True
+
+		metrics = self.metrics
+		forward = {init_state.key: (init_state.zero_loc << 3) | ROOT_MOVE}
+		backward = {goal: ROOT_MOVE}
+		parents = [forward, backward]
+		frontiers = [[init_state.key], [goal]]
+		depths = [0, 0]
+
+		while len(frontiers[0]) != 0 and len(frontiers[1]) != 0:
+			side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+			own, other = parents[side], parents[1 - side]
+			next_frontier = []
+			meetings = []
+			for key in frontiers[side]:
+				zero_loc = own[key] >> 3
+				zero_shift = zero_loc * bits
+				self.nodes_expanded += 1
+				if self.nodes_expanded >= self.next_checkpoint:
+					self.checkpoint(start_time)
+				for move, loc in moves[zero_loc]:
+					shift = loc * bits
+					tile = (key >> shift) & mask
+					child = key + (tile << zero_shift) - (tile << shift)
+					if child not in own:
+						own[child] = (loc << 3) | move
+						next_frontier.append(child)
+						if child in other:
+							meetings.append(child)
+					elif metrics is not None:
+						metrics.duplicate_hits += 1
+			frontiers[side] = next_frontier
+			depths[side] += 1
+			self.max_search_depth = max(depths)
+			if metrics is not None and len(frontiers[0]) + len(frontiers[1]) > metrics.max_frontier_size:
+				metrics.max_frontier_size = len(frontiers[0]) + len(frontiers[1])
+
+			if len(meetings) != 0:
+				for key in meetings:
+					path = unwind_parent_map(forward, key, layout) + invert_path(unwind_parent_map(backward, key, layout))
+					if len(self.path) == 0 or len(path) < len(self.path):
+						self.path = path
+				self.search_depth = len(self.path)
+				self.finish_search(start_time)
+				return True
+		self.finish_search(start_time)
+		return False
+
+	def ida(self, init_state):
+		'''
+		Implements Iterative-Deepening A*: repeated depth-first searches bounded by f = g + h, raising the bound to the
+		smallest f that exceeded it. The board is changed in place and restored on the way back, the move undoing the
+		previous one is skipped, and the heuristic (manhattan distance, or the pattern database set as the heuristic) is
+		updated from the one tile that moves, so memory stays proportional to the search depth.
+		'''
+		start_time = self.start_search()
+		board = list(init_state.current)
+		if not is_solvable(board):
+			self.finish_search(start_time)
+			return False
+		size = init_state.size
+		if isinstance(self.heuristic, PatternDatabase):
+			database = self.heuristic
+		else:
+			database = manhattan_database(size)
+		tables, tile_pattern, tile_weight = database.tables, database.tile_pattern, database.tile_weight
+		indices = database.indices(board)
+		linear = self.heuristic is manhattan_linear_conflict
+		moves = move_table(packed_layout(size))
+		inverse = (1, 0, 3, 2, None)
+		path = []
+
+		def search(zero_loc, g, h, bound, last_move):
+			f = g + h
+			if f > bound:
+				return f
+			if h == 0:
+				return -1
+			self.nodes_expanded += 1
+			if self.nodes_expanded >= self.next_checkpoint:
+				self.checkpoint(start_time)
+			if g + 1 > self.max_search_depth:
+				self.max_search_depth = g + 1
+			next_bound = float('inf')
+			for move, loc in moves[zero_loc]:
+				if move == inverse[last_move]:
+					continue
+				tile = board[loc]
+				pattern = tile_pattern[tile]
+				table = tables[pattern]
+				old_index = indices[pattern]
+				new_index = old_index + (zero_loc - loc) * tile_weight[tile]
+				child_h = h + ord(table[new_index:new_index + 1]) - ord(table[old_index:old_index + 1])
+				if linear:
+					child_h -= moved_lines_conflict(board, size, loc, zero_loc)
+				board[zero_loc] = tile
+				board[loc] = 0
+				if linear:
+					child_h += moved_lines_conflict(board, size, loc, zero_loc)
+				indices[pattern] = new_index
+				path.append(move)
+				result = search(loc, g + 1, child_h, bound, move)
+				if result < 0:
+					return result
+				path.pop()
+				indices[pattern] = old_index
+				board[loc] = tile
+				board[zero_loc] = 0
+				if result < next_bound:
+					next_bound = result
+			return next_bound
+
+		h = database.evaluate(board)
+		if linear:
+			h += linear_conflict(board, size)
+		bound = h
+		while True:
+			result = search(board.index(0), 0, h, bound, ROOT_MOVE)
+			if result < 0:
+				self.path = [MOVE_NAMES[move] for move in path]
+				self.search_depth = len(path)
+				self.finish_search(start_time)
+				return True
+			bound = result
+
+	def hda(self, init_state):
+		'''
+		Implements hash-distributed A* over self.workers processes. Every packed state is owned by one worker (chosen by
+		hda_owner), which runs A* on its own open list and best-g map and receives the states it owns from the other
+		workers in batches. The search ends when every worker is idle (no open node below the incumbent cost) and every
+		batch sent has been received, checked twice in a row with the same counts; only then is the incumbent optimal.
+		Per-worker expansions are kept in worker_expansions.
+		'''
+		start_time = self.start_search()
+		if not isinstance(init_state, PackedState):
+			init_state = pack_board(init_state.current)
+		layout = init_state.layout
+		workers = self.workers
+
+		inboxes = [multiprocessing.Queue() for _ in range(workers)]
+		results = multiprocessing.Queue()
+		incumbent = multiprocessing.Value('i', NO_INCUMBENT)
+		done = multiprocessing.Value('i', 0)
+		# The coordinator counts the batch it seeds the search with in the extra slot of sent
+		shared = {
+			'sent': multiprocessing.Array('i', workers + 1, lock = False),
+			'received': multiprocessing.Array('i', workers, lock = False),
+			'idle': multiprocessing.Array('i', [1] * workers, lock = False),
+			'expansions': multiprocessing.Array('i', workers, lock = False),
+		}
+		processes = [multiprocessing.Process(target = hda_worker,
+			args = (index, workers, layout, self.heuristic, inboxes, results, incumbent, shared, done)) for index in range(workers)]
+		for process in processes:
+			process.start()
+
+		try:
+			shared['sent'][workers] += 1
+			inboxes[hda_owner(init_state.key, workers)].put([(init_state.key, 0, (init_state.zero_loc << 3) | ROOT_MOVE)])
+			previous = None
+			while True:
+				time.sleep(0.002)
+				snapshot = (all(shared['idle']), sum(shared['sent']), sum(shared['received']))
+				if snapshot[0] and snapshot[1] == snapshot[2]:
+					if snapshot == previous:
+						break
+					previous = snapshot
+				else:
+					previous = None
+				self.nodes_expanded = sum(shared['expansions'])
+				if self.nodes_expanded >= self.next_checkpoint:
+					self.checkpoint(start_time)
+				elif self.time_limit is not None and time.time() - start_time > self.time_limit:
+					raise Search_limit_exception('time limit of %g s reached' % self.time_limit)
+
+			done.value = 1
+			self.worker_expansions = [0] * workers
+			for _ in range(workers):
+				_, index, expansions, max_depth = results.get()
+				self.worker_expansions[index] = expansions
+				self.max_search_depth = max(self.max_search_depth, max_depth)
+			self.nodes_expanded = sum(self.worker_expansions)
+			if incumbent.value != NO_INCUMBENT:
+				self.path = unwind_parent_map(Hda_parent_map(inboxes, results), layout[3], layout)
+				self.search_depth = len(self.path)
+		finally:
+			done.value = 1
+			for inbox in inboxes:
+				inbox.put(('stop',))
+			for process in processes:
+				process.join()
+		self.finish_search(start_time)
+		usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+		if usage > self.max_usage:
+			self.max_usage = usage
+		return incumbent.value != NO_INCUMBENT
+
 	def dfs(self, init_state):
 		'''
 		Implements Depth-First Search, following the algorithm introduced in lecture
 		'''
-		start_time = time.time()
+		start_time = self.start_search()
+		metrics = self.metrics
 		frontier = Stack()
 		frontier.push(init_state)
 		explored = set()
@@ -279,11 +1143,13 @@ class Solver:
 				temp_path.reverse()
 				self.path = temp_path
 				self.search_depth = cur_state.depth
-				self.run_time = time.time() - start_time
+				self.finish_search(start_time)
 				return True
 
 			children = cur_state.get_successors()
 			self.nodes_expanded += 1
+			if self.nodes_expanded >= self.next_checkpoint:
+				self.checkpoint(start_time)
 			children.reverse()
 			for child in children:
 				child.depth = cur_state.depth + 1
@@ -293,20 +1159,24 @@ class Solver:
 						explored.add(child)
 						if child.depth > self.max_search_depth:
 							self.max_search_depth = child.depth
-			ram_temp = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-			if ram_temp > self.max_usage:
-				self.max_usage = ram_temp
-		self.run_time = time.time() - start_time
+				elif metrics is not None:
+					metrics.duplicate_hits += 1
+			if metrics is not None and frontier.size() > metrics.max_frontier_size:
+				metrics.max_frontier_size = frontier.size()
+		self.finish_search(start_time)
 		return False
 
 	def astar(self, init_state):
 		'''
 		Implements A* Search, following the algorithm introduced in lecture
 		'''
-		start_time = time.time()
+		start_time = self.start_search()
+		metrics = self.metrics
 		frontier = Priority_Queue()
-		temp_pair = (manhattan_distance(init_state) + init_state.depth, init_state)
-		frontier.push(temp_pair)
+		if isinstance(init_state, State) and self.heuristic in (manhattan_distance, manhattan_linear_conflict):
+			init_state.track_heuristic(self.heuristic is manhattan_linear_conflict)
+		init_h = self.evaluate(init_state)
+		frontier.push((init_h + init_state.depth, init_state), init_h)
 		explored = set()
 
 		while frontier.size() != 0:
@@ -321,51 +1191,66 @@ class Solver:
 				temp_path.reverse()
 				self.path = temp_path
 				self.search_depth = cur_state.depth
-				self.run_time = time.time() - start_time
+				self.finish_search(start_time)
 				return True
 
 			children = cur_state.get_successors()
 			self.nodes_expanded += 1
+			if self.nodes_expanded >= self.next_checkpoint:
+				self.checkpoint(start_time)
 			for child in children:
 				child.depth = cur_state.depth + 1
 				if child not in explored:
-					if child not in frontier.p_set:
-						temp_pair_child = (manhattan_distance(child) + child.depth, child)
-						frontier.push(temp_pair_child)
-						explored.add(child)
+					child_h = self.evaluate(child)
+					if frontier.push((child_h + child.depth, child), child_h):
 						if child.depth > self.max_search_depth:
 							self.max_search_depth = child.depth
-					# else:
-						# Decrease key already handled by the push function in the Priority_Queue class
-			ram_temp = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
-			if ram_temp > self.max_usage:
-				self.max_usage = ram_temp
-		self.run_time = time.time() - start_time
+					elif metrics is not None:
+						metrics.duplicate_hits += 1
+				elif metrics is not None:
+					metrics.duplicate_hits += 1
+			if metrics is not None and frontier.size() > metrics.max_frontier_size:
+				metrics.max_frontier_size = frontier.size()
+		self.finish_search(start_time)
 		return False
 
 
 if __name__ == '__main__':
 	
 	# Check user input
-	if len(sys.argv) != 3:
-		print 'ERROR: USAGE: python driver.py <method> <board>'
-		sys.exit(0)
+	parser = argparse.ArgumentParser(usage = 'python driver.py <method> <board>')
+	parser.add_argument('method')
+	parser.add_argument('board')
+	parser.add_argument('--packed', action = 'store_true', help = 'store each board as a packed integer instead of a list')
+	parser.add_argument('--pdb', help = 'pattern database file (built by pattern_database.py) used as the heuristic for ast and ida')
+	parser.add_argument('--linear-conflict', action = 'store_true', help = 'add linear conflicts to the manhattan distance for ast and ida')
+	parser.add_argument('--metrics', help = 'also write the search metrics as JSON to this file')
+	parser.add_argument('--sample-every', type = int, default = 1024, help = 'expanded nodes between metric samples')
+	parser.add_argument('--sample-interval', type = float, help = 'seconds between metric samples')
+	parser.add_argument('--progress', action = 'store_true', help = 'report the metrics on standard error at every sample')
+	parser.add_argument('--no-instrumentation', action = 'store_true', help = 'collect no metrics at all (max_ram_usage is then 0)')
+	parser.add_argument('--workers', type = int, default = multiprocessing.cpu_count(), help = 'worker processes for hda')
+	args = parser.parse_args()
 
 	# Process user input
-	method = sys.argv[1]
-	board = [int(x) for x in sys.argv[2].split(',')]
-	state = State(board)
-	solver = Solver()
+	method = args.method
+	board = [int(x) for x in args.board.split(',')]
+	if args.packed:
+		state = pack_board(board)
+	else:
+		state = State(board)
+	metrics = Search_metrics(args.sample_every, args.sample_interval, print_progress if args.progress else None)
+	solver = make_solver(args.pdb, args.linear_conflict, metrics = metrics, instrumented = not args.no_instrumentation)
+	if isinstance(solver.heuristic, PatternDatabase) and solver.heuristic.size != state.size:
+		print 'The pattern database in %s is for a %dx%d board.' % (args.pdb, solver.heuristic.size, solver.heuristic.size)
+		sys.exit(0)
+	solver.workers = args.workers
 
 	# Solve the problem with the user-specified method
-	if method == 'bfs':
-		solver.bfs(state)
-	elif method == 'dfs':
-		solver.dfs(state)
-	elif method == 'ast':
-		solver.astar(state)
+	if method in METHODS:
+		result = solver.solve(method, state)
 	else:
-		print 'Please type in bfs, dfs, or ast as the method for solving the problem.'
+		print 'Please type in bfs, cbfs, bibfs, dfs, ast, ida, or hda as the method for solving the problem.'
 		sys.exit(0)
 
 	# Write the results to an output file		
@@ -377,4 +1262,15 @@ if __name__ == '__main__':
 	output_file.write('max_search_depth: ' + str(solver.max_search_depth) + '\n')
 	output_file.write('running_time: %.8f' % solver.run_time + '\n')
 	output_file.write('max_ram_usage: %.8f' % (float(solver.max_usage) / 1000000) + '\n')
-	output_file.close()
\ No newline at end of file
+	if method == 'hda':
+		output_file.write('worker_expansions: ' + str(solver.worker_expansions) + '\n')
+	if result == UNSOLVABLE:
+		output_file.write('result: ' + result + '\n')
+		output_file.write('solvability_check_time: %.8f' % solver.check_time + '\n')
+	output_file.close()
+
+	# Export the metrics next to the output file
+	if args.metrics and solver.metrics is not None:
+		metrics_file = open(args.metrics, 'w')
+		json.dump(solver.metrics.as_dict(), metrics_file, indent = 1, sort_keys = True)
+		metrics_file.close()
\ No newline at end of file
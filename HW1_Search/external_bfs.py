@@ -0,0 +1,274 @@
+'''
+Sheng Zhang
+HW1 | Search Algorithm: N-Puzzle -- external-memory breadth-first search
+
+Usage: python external_bfs.py <board> <scratch dir> [--sweep] [--max-depth D] [--buffer-states N]
+
+Every depth layer is written to the scratch directory as a file of sorted, fixed-width packed states. Layer d + 1 is
+generated by streaming layer d, sorting the children in buffers of at most buffer-states states (one temporary run
+file per buffer), and merging the runs while dropping duplicates and every state found in layers d and d - 1. Only
+these buffers are held in memory. A layer file only appears once it is complete, so an interrupted search resumes
+from the last complete layer when run again with the same board and scratch directory.
+'''
+
+import os
+import sys
+import heapq
+import struct
+import argparse
+import binascii
+
+from driver import MOVE_NAMES, move_table, pack_board
+
+
+CHUNK_STATES = 4096
+
+
+class Layer_store:
+	'''
+	Read and write the layer files of one search in a scratch directory
+	'''
+	def __init__(self, directory, layout):
+		self.directory = directory
+		self.layout = layout
+		size, bits = layout[:2]
+		self.width = (size * size * bits + 7) // 8
+
+	def layer_path(self, depth):
+		return os.path.join(self.directory, 'layer_%04d.bin' % depth)
+
+	def encode(self, key):
+		# Big-endian, so sorting the encoded states sorts the keys
+		if self.width == 8:
+			return struct.pack('>Q', key)
+		return binascii.unhexlify('%0*x' % (2 * self.width, key))
+
+	def decode(self, data):
+		if self.width == 8:
+			return struct.unpack('>Q', data)[0]
+		return int(binascii.hexlify(data), 16)
+
+	def read(self, path):
+		'''
+		Stream the keys of a layer or run file in order
+		'''
+		width = self.width
+		with open(path, 'rb') as input_file:
+			while True:
+				data = input_file.read(width * CHUNK_STATES)
+				if not data:
+					return
+				for i in range(0, len(data), width):
+					yield self.decode(data[i:i + width])
+
+	def write(self, path, keys):
+		'''
+		Write keys to a temporary file and rename it into place once complete; return the number of keys written
+		'''
+		count = 0
+		chunk = []
+		with open(path + '.tmp', 'wb') as output_file:
+			for key in keys:
+				chunk.append(self.encode(key))
+				count += 1
+				if len(chunk) == CHUNK_STATES:
+					output_file.write(b''.join(chunk))
+					chunk = []
+			output_file.write(b''.join(chunk))
+		os.rename(path + '.tmp', path)
+		return count
+
+	def layer_size(self, depth):
+		return os.path.getsize(self.layer_path(depth)) // self.width
+
+	def contains(self, depth, key):
+		'''
+		Binary search a sorted layer file for a key
+		'''
+		target = self.encode(key)
+		low, high = 0, self.layer_size(depth)
+		with open(self.layer_path(depth), 'rb') as input_file:
+			while low < high:
+				middle = (low + high) // 2
+				input_file.seek(middle * self.width)
+				data = input_file.read(self.width)
+				if data == target:
+					return True
+				if data < target:
+					low = middle + 1
+				else:
+					high = middle
+		return False
+
+	def complete_layers(self):
+		'''
+		Return the number of consecutive complete layer files, removing temporary files left by an interrupted run
+		'''
+		for name in os.listdir(self.directory):
+			if name.endswith('.tmp') or '.run_' in name:
+				os.remove(os.path.join(self.directory, name))
+		depth = 0
+		while os.path.exists(self.layer_path(depth)):
+			depth += 1
+		return depth
+
+
+def blank_position(key, layout):
+	size, bits, mask = layout[:3]
+	for loc in range(size * size):
+		if (key >> (loc * bits)) & mask == 0:
+			return loc
+
+
+def neighbours(key, layout, moves):
+	'''
+	Yield (move index, child key) for every move of the blank
+	'''
+	bits, mask = layout[1:3]
+	zero_loc = blank_position(key, layout)
+	zero_shift = zero_loc * bits
+	for move, loc in moves[zero_loc]:
+		shift = loc * bits
+		tile = (key >> shift) & mask
+		yield move, key + (tile << zero_shift) - (tile << shift)
+
+
+def unique(keys):
+	last = None
+	for key in keys:
+		if key != last:
+			yield key
+			last = key
+
+
+def subtract(keys, *layers):
+	'''
+	Drop the keys that appear in any of the sorted layer streams
+	'''
+	layers = [iter(layer) for layer in layers]
+	heads = [next(layer, None) for layer in layers]
+	for key in keys:
+		found = False
+		for i in range(len(layers)):
+			while heads[i] is not None and heads[i] < key:
+				heads[i] = next(layers[i], None)
+			if heads[i] == key:
+				found = True
+		if not found:
+			yield key
+
+
+def expand_layer(store, depth, moves, buffer_states):
+	'''
+	Generate layer depth + 1 from layer depth and return its size
+	'''
+	runs = []
+	buffer = []
+
+	def flush():
+		path = os.path.join(store.directory, 'layer_%04d.run_%04d' % (depth + 1, len(runs)))
+		store.write(path, sorted(set(buffer)))
+		runs.append(path)
+		del buffer[:]
+
+	for key in store.read(store.layer_path(depth)):
+		for _, child in neighbours(key, store.layout, moves):
+			buffer.append(child)
+		if len(buffer) >= buffer_states:
+			flush()
+	if buffer:
+		flush()
+
+	children = unique(heapq.merge(*[store.read(path) for path in runs]))
+	previous = [store.read(store.layer_path(depth))]
+	if depth > 0:
+		previous.append(store.read(store.layer_path(depth - 1)))
+	count = store.write(store.layer_path(depth + 1), subtract(children, *previous))
+	for path in runs:
+		os.remove(path)
+	return count
+
+
+def rebuild_path(store, depth, key, moves):
+	'''
+	Walk back from a key found in layer depth, looking up one parent per layer in the sorted layer files
+	'''
+	path = []
+	for parent_depth in range(depth - 1, -1, -1):
+		for move, parent in neighbours(key, store.layout, moves):
+			if store.contains(parent_depth, parent):
+				# The parent reaches key by the opposite of the move that leads from key to the parent
+				path.append(MOVE_NAMES[move ^ 1])
+				key = parent
+				break
+	path.reverse()
+	return path
+
+
+def external_bfs(board, directory, sweep = False, max_depth = None, buffer_states = 1000000, report = None):
+	'''
+	Run (or resume) the external-memory search from a board. Stop at the layer containing the goal unless sweep is set,
+	after max_depth layers, or when a layer is empty. Return (layer sizes, path to the goal or None).
+	'''
+	state = pack_board(board)
+	layout = state.layout
+	moves = move_table(layout)
+	goal = layout[3]
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+	store = Layer_store(directory, layout)
+
+	depth = store.complete_layers()
+	if depth == 0:
+		store.write(store.layer_path(0), [state.key])
+		depth = 1
+	elif next(store.read(store.layer_path(0)), None) != state.key:
+		raise ValueError('%s holds the layers of a different board' % directory)
+	sizes = [store.layer_size(d) for d in range(depth)]
+	if report is not None:
+		for d in range(depth):
+			report(d, sizes[d])
+
+	goal_depth = None
+	for d in range(depth):
+		if store.contains(d, goal):
+			goal_depth = d
+			break
+	while sizes[-1] != 0 and (sweep or goal_depth is None) and (max_depth is None or len(sizes) <= max_depth):
+		sizes.append(expand_layer(store, len(sizes) - 1, moves, buffer_states))
+		if report is not None:
+			report(len(sizes) - 1, sizes[-1])
+		if goal_depth is None and store.contains(len(sizes) - 1, goal):
+			goal_depth = len(sizes) - 1
+	if sizes[-1] == 0:
+		sizes.pop()
+
+	if goal_depth is None:
+		return sizes, None
+	return sizes, rebuild_path(store, goal_depth, goal, moves)
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Breadth-first search of the N-puzzle with depth layers kept on disk')
+	parser.add_argument('board')
+	parser.add_argument('scratch', help = 'directory holding the layer files; reused to resume an interrupted search')
+	parser.add_argument('--sweep', action = 'store_true', help = 'keep going past the goal until every reachable state is found')
+	parser.add_argument('--max-depth', type = int, help = 'stop after this many layers')
+	parser.add_argument('--buffer-states', type = int, default = 1000000, help = 'children sorted in memory at a time')
+	args = parser.parse_args()
+
+	def report(depth, count):
+		sys.stdout.write('layer %d: %d states\n' % (depth, count))
+		sys.stdout.flush()
+
+	board = [int(x) for x in args.board.split(',')]
+	sizes, path = external_bfs(board, args.scratch, args.sweep, args.max_depth, args.buffer_states, report)
+	sys.stdout.write('states: %d\n' % sum(sizes))
+	sys.stdout.write('max_search_depth: %d\n' % (len(sizes) - 1))
+	if path is not None:
+		sys.stdout.write('path_to_goal: %s\n' % path)
+		sys.stdout.write('cost_of_path: %d\n' % len(path))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,177 @@
+'''
+Sheng Zhang
+HW1 | Search Algorithm: N-Puzzle -- additive disjoint pattern databases
+
+Usage: python pattern_database.py <width> <output file> [--partition 1,2,3,4/5,6,7,8]
+'''
+
+import mmap
+import struct
+import argparse
+
+
+# Tiles of each pattern; every non-blank tile belongs to exactly one pattern
+DEFAULT_PARTITIONS = {
+	3: ((1, 2, 3, 4), (5, 6, 7, 8)),
+	4: ((4, 5, 8, 9, 12, 13), (6, 7, 10, 11, 14, 15), (1, 2, 3)),
+}
+
+MAGIC = b'NPDB'
+
+
+class PatternDatabase(object):
+	'''
+	Additive heuristic made of one lookup table per pattern. The entry of a pattern is found at
+	base + sum(position of tile * weight of tile), where the weight of the i-th tile of a pattern is n ** i,
+	so moving a single tile changes exactly one index by (new position - old position) * weight.
+	Tables are byte strings or a read-only mmap shared by all patterns.
+	'''
+	def __init__(self, size, patterns, tables, bases = None):
+		n = size * size
+		self.size = size
+		self.patterns = [tuple(pattern) for pattern in patterns]
+		self.tables = list(tables)
+		self.bases = list(bases) if bases is not None else [0] * len(self.patterns)
+		self.tile_pattern = [None] * n
+		self.tile_weight = [0] * n
+		for p, pattern in enumerate(self.patterns):
+			for slot, tile in enumerate(pattern):
+				self.tile_pattern[tile] = p
+				self.tile_weight[tile] = n ** slot
+		if sorted(tile for pattern in self.patterns for tile in pattern) != list(range(1, n)):
+			raise ValueError('patterns must partition the tiles 1..%d' % (n - 1))
+
+	def indices(self, board):
+		'''
+		Return the table index of every pattern for a board (list of tiles)
+		'''
+		indices = list(self.bases)
+		for loc, tile in enumerate(board):
+			if tile != 0:
+				indices[self.tile_pattern[tile]] += loc * self.tile_weight[tile]
+		return indices
+
+	def evaluate(self, board):
+		'''
+		Sum the pattern distances of a board
+		'''
+		return sum(ord(table[index:index + 1]) for table, index in zip(self.tables, self.indices(board)))
+
+	def __call__(self, state):
+		return self.evaluate(state.current)
+
+
+def neighbour_table(size):
+	'''
+	Return, for every cell, the cells the blank can move to
+	'''
+	neighbours = []
+	for loc in range(size * size):
+		cells = []
+		if loc >= size:
+			cells.append(loc - size)
+		if loc < size * (size - 1):
+			cells.append(loc + size)
+		if loc % size != 0:
+			cells.append(loc - 1)
+		if loc % size != size - 1:
+			cells.append(loc + 1)
+		neighbours.append(cells)
+	return neighbours
+
+
+def build_table(size, pattern):
+	'''
+	Build the table of one pattern by a backward breadth-first search from the goal over (pattern positions, blank).
+	Only moves of pattern tiles cost 1; the blank swapping with any other tile is free, which keeps the tables of
+	disjoint patterns additive. States reached at cost d are all settled before any state of cost d + 1 is expanded.
+	'''
+	n = size * size
+	k = len(pattern)
+	weights = [n ** slot for slot in range(k)]
+	neighbours = neighbour_table(size)
+	table = bytearray([255]) * (n ** k)
+	settled = bytearray((n ** (k + 1) + 7) // 8)
+
+	goal = sum(tile * weights[slot] for slot, tile in enumerate(pattern))
+	level = [goal * n]
+	distance = 0
+	while level:
+		next_level = []
+		while level:
+			state = level.pop()
+			if settled[state >> 3] & (1 << (state & 7)):
+				continue
+			settled[state >> 3] |= 1 << (state & 7)
+			index, blank = divmod(state, n)
+			if distance < table[index]:
+				table[index] = distance
+
+			occupied = {}
+			rest = index
+			for slot in range(k):
+				rest, loc = divmod(rest, n)
+				occupied[loc] = slot
+			for loc in neighbours[blank]:
+				slot = occupied.get(loc)
+				if slot is None:
+					level.append(index * n + loc)
+				else:
+					next_level.append((index + (blank - loc) * weights[slot]) * n + loc)
+		level = next_level
+		distance += 1
+	return table
+
+
+def save_pattern_database(path, size, patterns, tables):
+	'''
+	Write the header (magic, width, pattern tiles) followed by the raw tables
+	'''
+	with open(path, 'wb') as output_file:
+		output_file.write(MAGIC + struct.pack('BB', size, len(patterns)))
+		for pattern in patterns:
+			output_file.write(struct.pack('B%dB' % len(pattern), len(pattern), *pattern))
+		for table in tables:
+			output_file.write(table)
+
+
+def load_pattern_database(path):
+	'''
+	Map a saved pattern database read-only into memory; tables are read lazily through the shared mmap
+	'''
+	with open(path, 'rb') as input_file:
+		data = mmap.mmap(input_file.fileno(), 0, access = mmap.ACCESS_READ)
+	if data[:4] != MAGIC:
+		raise ValueError('%s is not a pattern database' % path)
+	size, count = struct.unpack('BB', data[4:6])
+	offset = 6
+	patterns = []
+	for _ in range(count):
+		length = struct.unpack('B', data[offset:offset + 1])[0]
+		patterns.append(struct.unpack('%dB' % length, data[offset + 1:offset + 1 + length]))
+		offset += 1 + length
+	bases = []
+	for pattern in patterns:
+		bases.append(offset)
+		offset += (size * size) ** len(pattern)
+	return PatternDatabase(size, patterns, [data] * count, bases)
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Build additive disjoint pattern databases for the N-puzzle')
+	parser.add_argument('size', type = int, help = 'board width (3 for the 8-puzzle, 4 for the 15-puzzle)')
+	parser.add_argument('output')
+	parser.add_argument('--partition', help = 'tiles of each pattern, e.g. 1,2,3,4/5,6,7,8')
+	args = parser.parse_args()
+
+	if args.partition:
+		patterns = [tuple(int(tile) for tile in pattern.split(',')) for pattern in args.partition.split('/')]
+	else:
+		patterns = DEFAULT_PARTITIONS[args.size]
+	PatternDatabase(args.size, patterns, [b''] * len(patterns))
+	tables = [build_table(args.size, pattern) for pattern in patterns]
+	save_pattern_database(args.output, args.size, patterns, tables)
+
+
+if __name__ == '__main__':
+	main()
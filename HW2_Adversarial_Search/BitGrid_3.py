@@ -0,0 +1,328 @@
+'''
+Sheng Zhang
+HW2 | Adversarial Search Problem: 2048-Game -- bitboard grid
+
+A drop-in replacement for Grid_3.Grid that keeps the board in one integer of log2 exponents: cell (x, y) of a
+size x size board is the field of cellBits bits at bit cellBits * (size * x + y) and 0 stands for an empty cell.
+A move looks up each row in a table (columns are moved as the rows of the transposed board), and clone only copies
+the integer.
+A 4x4 board has 4-bit cells, fits in 64 bits and its 16-bit rows have full 65,536-entry tables. An exponent of 15
+(the 32768 tile) is the largest a nibble holds, so on 4x4 two 32768 tiles never merge.
+Larger boards have cells of at least 6 bits, wide enough for every tile they can reach (2 ** (size * size + 1)),
+so they follow the rules of Grid_3 exactly. Their 30 and 36-bit rows (5x5 and 6x6) are far too many to tabulate,
+so their tables are filled in on the first lookup of each row, and their transpose places every row with a table
+as well.
+'''
+
+directionVectors = (UP_VEC, DOWN_VEC, LEFT_VEC, RIGHT_VEC) = ((-1, 0), (1, 0), (0, -1), (0, 1))
+vecIndex = [UP, DOWN, LEFT, RIGHT] = range(4)
+
+MAX_EXPONENT = 15
+
+
+def cellBitsFor(size):
+    '''
+    Bits per cell of a size x size board: 4 on 4x4, otherwise enough for the largest tile the board can reach
+    '''
+    if size == 4:
+        return 4
+    return max(6, (size * size + 1).bit_length())
+
+
+def moveRowLeft(exponents, maxExponent = MAX_EXPONENT):
+    '''
+    Slide and merge one row of exponents towards index 0, the same way Grid.merge does
+    '''
+    tiles = [e for e in exponents if e != 0]
+    row = []
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] != maxExponent:
+            row.append(tiles[i] + 1)
+            i += 2
+        else:
+            row.append(tiles[i])
+            i += 1
+    return row + [0] * (len(exponents) - len(row))
+
+
+def packRow(exponents, cellBits = 4):
+    row = 0
+    for e in reversed(exponents):
+        row = row << cellBits | e
+    return row
+
+
+def unpackRow(row, size, cellBits = 4):
+    mask = (1 << cellBits) - 1
+    return [(row >> (cellBits * j)) & mask for j in range(size)]
+
+
+def buildTables():
+    '''
+    Return the moved row for a move towards column 0 and towards column 3, and the tile values, of every 16-bit row
+    '''
+    left = [0] * 65536
+    right = [0] * 65536
+    values = [None] * 65536
+    for row in range(65536):
+        exponents = [row & 0xF, (row >> 4) & 0xF, (row >> 8) & 0xF, (row >> 12) & 0xF]
+        left[row] = packRow(moveRowLeft(exponents))
+        right[row] = packRow(moveRowLeft(exponents[::-1])[::-1])
+        values[row] = [1 << e if e else 0 for e in exponents]
+    return left, right, values
+
+
+(ROW_LEFT, ROW_RIGHT, ROW_VALUES) = buildTables()
+
+
+def transpose(board):
+    '''
+    Swap rows and columns of a packed board
+    '''
+    a = (board & 0xF0F00F0FF0F00F0F) | ((board & 0x0000F0F00000F0F0) << 12) | ((board & 0x0F0F00000F0F0000) >> 12)
+    return (a & 0xFF00FF0000FF00FF) | ((a & 0x00FF00FF00000000) >> 24) | ((a & 0x00000000FF00FF00) << 24)
+
+
+def moveRows(board, table):
+    return (table[board & 0xFFFF] | table[(board >> 16) & 0xFFFF] << 16 |
+            table[(board >> 32) & 0xFFFF] << 32 | table[board >> 48] << 48)
+
+
+def moveBoard(board, dir):
+    '''
+    Return the packed board after moving in a direction
+    '''
+    if dir == LEFT:
+        return moveRows(board, ROW_LEFT)
+    if dir == RIGHT:
+        return moveRows(board, ROW_RIGHT)
+    if dir == UP:
+        return transpose(moveRows(transpose(board), ROW_LEFT))
+    return transpose(moveRows(transpose(board), ROW_RIGHT))
+
+
+def exponent(value, maxExponent = MAX_EXPONENT):
+    if value == 0:
+        return 0
+    e = value.bit_length() - 1
+    if value != 1 << e or e > maxExponent:
+        raise ValueError('%d is not a tile of the bitboard grid' % value)
+    return e
+
+
+class LazyTable(dict):
+    '''
+    Row table whose entries are computed on the first lookup of each row, for rows too wide to tabulate in full
+    '''
+    def __init__(self, build):
+        dict.__init__(self)
+        self.build = build
+
+    def __missing__(self, row):
+        value = self[row] = self.build(row)
+        return value
+
+
+class RowTables:
+    '''
+    Row tables and board operations of one board size, shared by all the grids of that size
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.cellBits = cellBitsFor(size)
+        self.cellMask = (1 << self.cellBits) - 1
+        self.maxExponent = self.cellMask
+        self.rowBits = self.cellBits * size
+        self.rowMask = (1 << self.rowBits) - 1
+        self.boardBits = self.rowBits * size
+        self.rowShifts = tuple(range(0, self.boardBits, self.rowBits))
+        self.cellShifts = tuple(range(0, self.boardBits, self.cellBits))
+
+        if size == 4:
+            # The Full Tables and the Bit-Twiddling Transpose
+            (self.left, self.right, self.values) = (ROW_LEFT, ROW_RIGHT, ROW_VALUES)
+            self.transpose = transpose
+            self.moveBoard = moveBoard
+            return
+
+        self.left = LazyTable(lambda row: packRow(moveRowLeft(self.unpack(row), self.maxExponent), self.cellBits))
+        self.right = LazyTable(lambda row: packRow(moveRowLeft(self.unpack(row)[::-1], self.maxExponent)[::-1],
+                                                   self.cellBits))
+        self.values = LazyTable(lambda row: [1 << e if e else 0 for e in self.unpack(row)])
+        # Row 0 Turned into Column 0: Cell y Moves to Bit rowBits * y
+        self.spread = LazyTable(lambda row: sum(e << (self.rowBits * y) for y, e in enumerate(self.unpack(row))))
+
+    # The Exponents of One Row
+    def unpack(self, row):
+        return unpackRow(row, self.size, self.cellBits)
+
+    # Split a Board into Its Rows
+    def rows(self, board):
+        mask = self.rowMask
+        return [(board >> shift) & mask for shift in self.rowShifts]
+
+    def moveRows(self, board, table):
+        mask = self.rowMask
+        moved = 0
+        for shift in self.rowShifts:
+            moved |= table[(board >> shift) & mask] << shift
+        return moved
+
+    def transpose(self, board):
+        spread = self.spread
+        mask = self.rowMask
+        transposed = 0
+        for x, shift in enumerate(self.rowShifts):
+            transposed |= spread[(board >> shift) & mask] << (self.cellBits * x)
+        return transposed
+
+    def moveBoard(self, board, dir):
+        if dir == LEFT:
+            return self.moveRows(board, self.left)
+        if dir == RIGHT:
+            return self.moveRows(board, self.right)
+        if dir == UP:
+            return self.transpose(self.moveRows(self.transpose(board), self.left))
+        return self.transpose(self.moveRows(self.transpose(board), self.right))
+
+
+# Row Tables of Every Board Size Used So Far
+rowTables = {}
+
+
+def tablesFor(size):
+    tables = rowTables.get(size)
+    if tables is None:
+        tables = rowTables[size] = RowTables(size)
+    return tables
+
+
+class Row(list):
+    '''
+    One row of Grid.map; writing a cell writes it through to the packed board as well
+    '''
+    def __init__(self, grid, x, values):
+        list.__init__(self, values)
+        self.grid = grid
+        self.x = x
+
+    def __setitem__(self, y, value):
+        list.__setitem__(self, y, value)
+        self.grid.setCellValue((self.x, y), value)
+
+
+class Grid:
+    def __init__(self, size = 4):
+        self.size = size
+        self.tables = tablesFor(size)
+        self.board = 0
+        self.mapBoard = None
+
+    # The Board as a List of Rows of Tile Values, Decoded Once per Position
+    @property
+    def map(self):
+        if self.mapBoard != self.board:
+            board = self.board
+            values = self.tables.values
+            self.rows = [Row(self, x, values[row]) for x, row in enumerate(self.tables.rows(board))]
+            self.mapBoard = board
+        return self.rows
+
+    @map.setter
+    def map(self, rows):
+        tables = self.tables
+        self.board = 0
+        for x in range(self.size):
+            for y in range(self.size):
+                self.board |= exponent(rows[x][y], tables.maxExponent) << tables.cellShifts[self.size * x + y]
+
+    # Copying the Board Integer Is All a Clone Needs; the Copy Shares This Grid's Tables Rather Than Looking Them Up
+    def clone(self):
+        gridCopy = Grid.__new__(Grid)
+        gridCopy.size = self.size
+        gridCopy.tables = self.tables
+        gridCopy.board = self.board
+        gridCopy.mapBoard = None
+
+        return gridCopy
+
+    # Insert a Tile in an Empty Cell
+    def insertTile(self, pos, value):
+        self.setCellValue(pos, value)
+
+    def setCellValue(self, pos, value):
+        tables = self.tables
+        shift = tables.cellShifts[self.size * pos[0] + pos[1]]
+        board = (self.board & ~(tables.cellMask << shift)) | (exponent(value, tables.maxExponent) << shift)
+        # Patch the Decoded Rows Only If They Hold the Board Being Written; Stale Rows Are Decoded Again by map
+        if self.mapBoard == self.board:
+            list.__setitem__(self.rows[pos[0]], pos[1], value)
+            self.mapBoard = board
+        self.board = board
+
+    # Return All the Empty Cells
+    def getAvailableCells(self):
+        board = self.board
+        size = self.size
+        mask = self.tables.cellMask
+        return [divmod(cell, size) for cell, shift in enumerate(self.tables.cellShifts) if (board >> shift) & mask == 0]
+
+    # Return the Tile with Maximum Value
+    def getMaxTile(self):
+        board = self.board
+        (cellBits, mask) = (self.tables.cellBits, self.tables.cellMask)
+        maxExponent = 0
+        while board:
+            if board & mask > maxExponent:
+                maxExponent = board & mask
+            board >>= cellBits
+
+        return 1 << maxExponent if maxExponent else 0
+
+    # Check If Able to Insert a Tile in Position
+    def canInsert(self, pos):
+        return self.getCellValue(pos) == 0
+
+    # Move the Grid
+    def move(self, dir):
+        board = self.tables.moveBoard(self.board, int(dir))
+        moved = board != self.board
+        self.board = board
+
+        return moved
+
+    def hasEmptyCell(self):
+        board = self.board
+        mask = self.tables.cellMask
+        for shift in self.tables.cellShifts:
+            if (board >> shift) & mask == 0:
+                return True
+
+        return False
+
+    # Same Answer as Grid.canMove: Any Empty Cell, or a Move in dirs That Merges Tiles
+    def canMove(self, dirs = vecIndex):
+        if self.hasEmptyCell():
+            return True
+
+        for dir in dirs:
+            if self.tables.moveBoard(self.board, dir) != self.board:
+                return True
+
+        return False
+
+    # Return All Available Moves
+    def getAvailableMoves(self, dirs = vecIndex):
+        moveBoard = self.tables.moveBoard
+        return [dir for dir in dirs if moveBoard(self.board, dir) != self.board]
+
+    def crossBound(self, pos):
+        return pos[0] < 0 or pos[0] >= self.size or pos[1] < 0 or pos[1] >= self.size
+
+    def getCellValue(self, pos):
+        if not self.crossBound(pos):
+            e = (self.board >> self.tables.cellShifts[self.size * pos[0] + pos[1]]) & self.tables.cellMask
+            return 1 << e if e else 0
+        else:
+            return None
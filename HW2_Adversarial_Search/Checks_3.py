@@ -0,0 +1,231 @@
+'''
+Sheng Zhang
+HW2 | Adversarial Search Problem: 2048-Game -- consistency checks
+
+Usage: python Checks_3.py [--boards N] [--moves M] [--seed S]
+
+Checks that the faster code paths give the same answers as the plain ones, on seeded random boards of sizes 4 to 6:
+- the bitboard grid against the list grid (a 4x4 board stops being moved once it holds a 32768 tile, as two of them
+  do not merge on a 4x4 bitboard; larger boards also hold tiles above it)
+- PlayerAI_3.eval (cached, table-driven) against the formula it was first written as
+- the NumPy kernels of batch_eval against eval, and expectimax with and without batch_leaves (when NumPy is installed)
+- in seeded expectimax games, a player keeping its transposition table across moves only stops deepening as
+  converged where a fresh player would
+Stops at the first difference with an AssertionError.
+'''
+
+import math
+import random
+import argparse
+
+from Grid_3 import Grid
+from BitGrid_3 import Grid as BitGrid
+import PlayerAI_3
+
+SIZES = (4, 5, 6)
+
+# Tiles of the random boards, with empty cells and small tiles the most common
+TILES = (0, 0, 0, 2, 2, 4, 8, 16, 32, 64, 128, 1024, 2048, 4096, 16384)
+
+# Further tiles of the random boards larger than 4x4, whose bitboard cells are wider than a nibble
+WIDE_TILES = TILES + (32768, 32768, 65536, 2**20)
+
+# Subsets of directions canMove is asked about
+DIRECTION_SETS = ([0], [1], [2], [3], [0, 1], [2, 3], [0, 1, 2, 3])
+
+
+def random_grids(size, rng):
+	'''
+	Return a list grid and a bitboard grid holding the same random board; the bitboard cells are written both
+	through map and through setCellValue
+	'''
+	grid = Grid(size)
+	bit_grid = BitGrid(size)
+	tiles = TILES if size == 4 else WIDE_TILES
+	for x in range(size):
+		for y in range(size):
+			value = rng.choice(tiles)
+			grid.map[x][y] = value
+			if rng.random() < 0.5:
+				bit_grid.map[x][y] = value
+			else:
+				bit_grid.setCellValue((x, y), value)
+	return (grid, bit_grid)
+
+
+def check_grids(boards, rng):
+	'''
+	BitGrid_3 against Grid_3: cells, max tile, available moves, canMove, moves of clones and moves, over a few random
+	moves from every board, each followed by a tile placed with insertTile or setCellValue
+	'''
+	for size in SIZES:
+		for _ in range(boards):
+			(grid, bit_grid) = random_grids(size, rng)
+			for _ in range(5):
+				assert grid.map == [list(row) for row in bit_grid.map], (grid.map, bit_grid.map)
+				assert grid.getAvailableCells() == bit_grid.getAvailableCells(), grid.map
+				assert grid.getMaxTile() == bit_grid.getMaxTile(), grid.map
+				assert grid.getAvailableMoves() == bit_grid.getAvailableMoves(), grid.map
+				for dirs in DIRECTION_SETS:
+					assert grid.canMove(dirs) == bit_grid.canMove(dirs), (grid.map, dirs)
+				for dir in range(4):
+					(copy, bit_copy) = (grid.clone(), bit_grid.clone())
+					assert copy.move(dir) == bit_copy.move(dir), (grid.map, dir)
+					assert bit_copy.size == copy.size == size and copy.map == [list(row) for row in bit_copy.map], (
+						grid.map, dir)
+				dir = rng.randrange(4)
+				assert grid.move(dir) == bit_grid.move(dir), (grid.map, dir)
+				if size == 4 and grid.getMaxTile() >= 32768:
+					break
+				# A tile placed after the move, while the bitboard still holds the rows decoded before it
+				cells = grid.getAvailableCells()
+				if cells:
+					(cell, value) = (rng.choice(cells), rng.choice((2, 4)))
+					grid.insertTile(cell, value)
+					if rng.random() < 0.5:
+						bit_grid.insertTile(cell, value)
+					else:
+						bit_grid.setCellValue(cell, value)
+		print('grids: %dx%d ok' % (size, size))
+
+
+def reference_eval(grid):
+	'''
+	The heuristic of PlayerAI_3.eval computed cell by cell as it was first written, for a board of any size: the
+	monotonicity weight of a cell falls by 0.5**2 per step away from the bottom-right corner (cells above the
+	anti-diagonal do not count), and the smoothness is minus the differences of all neighbouring cells
+	'''
+	size = grid.size
+	m = grid.map
+	empty_cells = len(grid.getAvailableCells())
+	max_tile = grid.getMaxTile()
+	monotonicity = 0
+	for i in range(size):
+		for j in range(size):
+			if i + j >= size - 1:
+				monotonicity += m[i][j] * 0.5**(2 * (2 * (size - 1) - i - j))
+	smoothness = []
+	for i in range(size):
+		for j in range(size):
+			if i < size - 1:
+				smoothness.append(abs(m[i][j] - m[i + 1][j]))
+			if j < size - 1:
+				smoothness.append(abs(m[i][j] - m[i][j + 1]))
+	smoothness = -sum(smoothness)
+
+	if empty_cells != 0:
+		return 3*empty_cells + max_tile + 10*monotonicity + 0.2*smoothness
+	return 0
+
+
+def check_eval(boards, rng):
+	'''
+	PlayerAI_3.eval of list and bitboard grids, with an empty and with a filled cache, against reference_eval; the
+	scores must have the same repr, that is be equal to the last bit
+	'''
+	for size in SIZES:
+		for n in range(boards):
+			(grid, bit_grid) = random_grids(size, rng)
+			if n % 5 == 0:
+				# Full boards score 0
+				for x in range(size):
+					for y in range(size):
+						grid.map[x][y] = bit_grid.map[x][y] = rng.choice(TILES[3:])
+			expected = repr(reference_eval(grid))
+			PlayerAI_3.eval_cache.clear()
+			scores = (PlayerAI_3.eval(grid), PlayerAI_3.eval(bit_grid), PlayerAI_3.eval(grid))
+			PlayerAI_3.eval_cache.clear()
+			scores += (PlayerAI_3.eval(bit_grid), PlayerAI_3.eval(grid))
+			assert all(repr(score) == expected for score in scores), (grid.map, expected, scores)
+		print('eval: %dx%d ok' % (size, size))
+
+
+def check_batch_eval(boards, rng):
+	'''
+	PlayerAI_3.batch_eval of a batch of boards against PlayerAI_3.eval of each; the scores must be equal to the last
+	bit, except that a full board scores 0.0 rather than 0
+	'''
+	np = PlayerAI_3.np
+	for size in SIZES:
+		grids = []
+		for n in range(boards):
+			(grid, _) = random_grids(size, rng)
+			if n % 5 == 0:
+				for x in range(size):
+					for y in range(size):
+						grid.map[x][y] = rng.choice(TILES[3:])
+			grids.append(grid)
+		values = np.array([[value for row in grid.map for value in row] for grid in grids], dtype = np.int64)
+		PlayerAI_3.eval_cache.clear()
+		for (grid, score) in zip(grids, PlayerAI_3.batch_eval(values, size).tolist()):
+			assert repr(float(PlayerAI_3.eval(grid))) == repr(score), (grid.map, PlayerAI_3.eval(grid), score)
+		print('batch_eval: %dx%d ok' % (size, size))
+
+
+def check_batch_search(rng):
+	'''
+	Expectimax with batch_leaves against expectimax without: on the same boards and node budget both must pick the
+	same moves, search the same number of nodes and find the same value at every depth
+	'''
+	for size in SIZES[:2]:
+		for grid_class in (BitGrid, Grid):
+			players = [PlayerAI_3.PlayerAI(mode = PlayerAI_3.EXPECTIMAX, time_limit = math.inf, node_limit = 5000,
+				batch_leaves = batch_leaves) for batch_leaves in (False, True)]
+			for _ in range(5):
+				(list_grid, bit_grid) = random_grids(size, rng)
+				grid = bit_grid if grid_class is BitGrid else list_grid
+				if not grid.canMove():
+					continue
+				searches = []
+				for player in players:
+					move = player.getMove(grid.clone())
+					searches.append((move, player.move_nodes, [iteration[4] for iteration in player.iterations]))
+				assert searches[0] == searches[1], (grid.map, searches)
+			print('batched expectimax: %dx%d %s ok' % (size, size, grid_class.__module__))
+
+
+def check_expectimax_convergence(moves, rng):
+	'''
+	Expectimax stops deepening once no branch reached the depth limit. Entries left in the transposition table by
+	earlier moves must not make a later move look converged: wherever the player of a game stops that way, a fresh
+	player searching the same board with the same node budget must converge as well, and no deeper.
+	'''
+	for grid_class in (BitGrid, Grid):
+		grid = grid_class()
+		for _ in range(2):
+			grid.setCellValue(rng.choice(grid.getAvailableCells()), 2)
+		player = PlayerAI_3.PlayerAI(mode = PlayerAI_3.EXPECTIMAX, time_limit = math.inf, node_limit = 10000)
+		for _ in range(moves):
+			if not grid.canMove():
+				break
+			move = player.getMove(grid.clone())
+			if player.converged:
+				fresh = PlayerAI_3.PlayerAI(mode = PlayerAI_3.EXPECTIMAX, time_limit = math.inf, node_limit = 10000)
+				fresh.getMove(grid.clone())
+				assert fresh.converged and fresh.depth_reached <= player.depth_reached, (grid.map,
+					player.depth_reached, fresh.depth_reached)
+			grid.move(move)
+			grid.setCellValue(rng.choice(grid.getAvailableCells()), 2 if rng.random() < 0.9 else 4)
+		print('expectimax convergence: %s ok' % grid_class.__module__)
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Check the fast code paths against the plain ones')
+	parser.add_argument('--boards', type = int, default = 1000, help = 'random boards per size and check')
+	parser.add_argument('--moves', type = int, default = 40, help = 'moves of the seeded expectimax games')
+	parser.add_argument('--seed', type = int, default = 0)
+	args = parser.parse_args()
+
+	rng = random.Random(args.seed)
+	check_grids(args.boards, rng)
+	check_eval(args.boards, rng)
+	if PlayerAI_3.np is not None:
+		check_batch_eval(args.boards, rng)
+		check_batch_search(rng)
+	else:
+		print('batch_eval: skipped, NumPy is not installed')
+	check_expectimax_convergence(args.moves, rng)
+
+
+if __name__ == '__main__':
+	main()
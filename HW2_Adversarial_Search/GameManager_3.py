@@ -1,9 +1,13 @@
 from Grid_3       import Grid
+from BitGrid_3    import Grid as BitGrid
 from ComputerAI_3 import ComputerAI
 from PlayerAI_3   import PlayerAI
+import PlayerAI_3
 from Displayer_3  import Displayer
 from random       import randint
+import multiprocessing
 import time
+import sys
 
 defaultInitialTiles = 2
 defaultProbability = 0.9
@@ -22,8 +26,8 @@ timeLimit = 0.2
 allowance = 0.05
 
 class GameManager:
-    def __init__(self, size = 4):
-        self.grid = Grid(size)
+    def __init__(self, size = 4, gridClass = Grid):
+        self.grid = gridClass(size)
         self.possibleNewTiles = [2, 4]
         self.probability = defaultProbability
         self.initTiles  = defaultInitialTiles
@@ -45,10 +49,10 @@ class GameManager:
         if currTime - self.prevTime > timeLimit + allowance:
             self.over = True
         else:
-            while time.clock() - self.prevTime < timeLimit + allowance:
+            while time.perf_counter() - self.prevTime < timeLimit + allowance:
                 pass
 
-            self.prevTime = time.clock()
+            self.prevTime = time.perf_counter()
 
     def start(self):
         for i in range(self.initTiles):
@@ -60,7 +64,7 @@ class GameManager:
         turn = PLAYER_TURN
         maxTile = 0
 
-        self.prevTime = time.clock()
+        self.prevTime = time.perf_counter()
 
         while not self.isGameOver() and not self.over:
             # Copy to Ensure AI Cannot Change the Real Grid to Cheat
@@ -101,7 +105,7 @@ class GameManager:
                 self.displayer.display(self.grid)
 
             # Exceeding the Time Allotted for Any Turn Terminates the Game
-            self.updateAlarm(time.clock())
+            self.updateAlarm(time.perf_counter())
 
             turn = 1 - turn
         print(maxTile)
@@ -122,8 +126,18 @@ class GameManager:
         self.grid.setCellValue(cell, tileValue)
 
 def main():
-    gameManager = GameManager()
-    playerAI    = PlayerAI()
+    if '--batch-leaves' in sys.argv[1:] and PlayerAI_3.np is None:
+        sys.exit('GameManager_3.py: error: --batch-leaves needs NumPy, which is not installed')
+
+    # Play on the Bitboard Grid with --bitboard, and on an N x N Board with --size N
+    size = int(sys.argv[sys.argv.index('--size') + 1]) if '--size' in sys.argv[1:] else 4
+    gameManager = GameManager(size, gridClass = BitGrid if '--bitboard' in sys.argv[1:] else Grid)
+    # Search with expectimax instead of alpha-beta with --expectimax
+    # Split the Root Moves over One Worker Process per CPU with --parallel
+    # Score the Last Expectimax Layer in NumPy Batches with --batch-leaves
+    playerAI    = PlayerAI(mode = 'expectimax' if '--expectimax' in sys.argv[1:] else 'alphabeta',
+                           workers = multiprocessing.cpu_count() if '--parallel' in sys.argv[1:] else 1,
+                           batch_leaves = '--batch-leaves' in sys.argv[1:])
     computerAI  = ComputerAI()
     displayer   = Displayer()
 
@@ -131,7 +145,10 @@ def main():
     gameManager.setPlayerAI(playerAI)
     gameManager.setComputerAI(computerAI)
 
-    gameManager.start()
+    try:
+        gameManager.start()
+    finally:
+        playerAI.close()
 
 if __name__ == '__main__':
     main()
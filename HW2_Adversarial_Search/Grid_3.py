@@ -10,9 +10,8 @@ class Grid:
 
     # Make a Deep Copy of This Object
     def clone(self):
-        gridCopy = Grid()
+        gridCopy = Grid(self.size)
         gridCopy.map = deepcopy(self.map)
-        gridCopy.size = self.size
 
         return gridCopy
 
@@ -132,42 +131,39 @@ class Grid:
 
     def canMove(self, dirs = vecIndex):
 
-        # Init Moves to be Checked
-        checkingMoves = set(dirs)
+        # Any Empty Cell Counts as a Possible Move
+        for row in self.map:
+            if 0 in row:
+                return True
 
-        for x in range(self.size):
-            for y in range(self.size):
-
-                # If Current Cell is Filled
-                if self.map[x][y]:
-
-                    # Look Ajacent Cell Value
-                    for i in checkingMoves:
-                        move = directionVectors[i]
-
-                        adjCellValue = self.getCellValue((x + move[0], y + move[1]))
+        for dir in dirs:
+            if self.canMoveDir(dir):
+                return True
 
-                        # If Value is the Same or Adjacent Cell is Empty
-                        if adjCellValue == self.map[x][y] or adjCellValue == 0:
-                            return True
+        return False
 
-                # Else if Current Cell is Empty
-                elif self.map[x][y] == 0:
-                    return True
+    # Check If Moving in a Direction Changes the Grid, Without Copying or Moving It
+    def canMoveDir(self, dir):
+        (dx, dy) = directionVectors[int(dir)]
+        size = self.size
+        cells = self.map
+
+        # Some Tile Must Have an Empty or Equal Neighbour on the Side It Moves To
+        for x in range(max(0, -dx), min(size, size - dx)):
+            row = cells[x]
+            nextRow = cells[x + dx]
+            for y in range(max(0, -dy), min(size, size - dy)):
+                value = row[y]
+                if value:
+                    adjCellValue = nextRow[y + dy]
+                    if adjCellValue == 0 or adjCellValue == value:
+                        return True
 
         return False
 
     # Return All Available Moves
     def getAvailableMoves(self, dirs = vecIndex):
-        availableMoves = []
-
-        for x in dirs:
-            gridCopy = self.clone()
-
-            if gridCopy.move(x):
-                availableMoves.append(x)
-
-        return availableMoves
+        return [x for x in dirs if self.canMoveDir(x)]
 
     def crossBound(self, pos):
         return pos[0] < 0 or pos[0] >= self.size or pos[1] < 0 or pos[1] >= self.size
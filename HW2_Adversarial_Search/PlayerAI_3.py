@@ -5,9 +5,173 @@ HW2 | Adversarial Search Problem: 2048-Game
 
 from BaseAI_3 import BaseAI
 from Grid_3 import Grid
+from BitGrid_3 import Grid as BitGrid, LazyTable, tablesFor, transpose
+import os
+import sys
 import math
 import time
-from operator import attrgetter
+import random
+import multiprocessing
+import multiprocessing.connection
+
+# NumPy is only needed for the batched evaluation of leaves (PlayerAI(batch_leaves = True))
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+def neighboring_pairs(size):
+	'''
+	Cells next to each other, as (row, column, row, column): every cell with the one below it and the one to its right
+	'''
+	return tuple((i, j, i + di, j + dj) for i in range(size) for j in range(size) for (di, dj) in ((1, 0), (0, 1))
+		if i + di < size and j + dj < size)
+
+
+def monotonicity_weights(size):
+	'''
+	Weight of every cell in the monotonicity measure: 1 in the bottom-right corner, falling by 0.5**2 per step away
+	from it, and 0 above the anti-diagonal
+	'''
+	corner = 2 * (size - 1)
+	return tuple(tuple(0.5**(2 * (corner - i - j)) if i + j >= size - 1 else 0 for j in range(size))
+		for i in range(size))
+
+
+NEIGHBORING_PAIRS = neighboring_pairs(4)
+MONOTONICITY_WEIGHTS = monotonicity_weights(4)
+
+# (neighboring pairs, monotonicity weights) of every board size used so far, built by size_tables
+heuristic_tables = {}
+
+# Per-row measure tables of bitboards larger than 4x4, filled in row by row (see wide_row_tables)
+wide_row_measures = {}
+
+# Evaluated boards, keyed by board_key; emptied when it reaches the maximum number of entries
+eval_cache = {}
+EVAL_CACHE_ENTRIES = 1 << 18
+
+# Per-row measures of a bitboard row, built by load_row_tables
+row_tables = None
+
+
+def build_row_tables():
+	'''
+	Return, for every 16-bit bitboard row: its empty cells, max exponent, sum of differences between neighbours, and
+	its monotonicity contribution when it is row 0, 1, 2 or 3
+	'''
+	empty = [0] * 65536
+	max_exponent = [0] * 65536
+	smoothness = [0] * 65536
+	monotonicity = [[0] * 65536 for i in range(4)]
+	for row in range(65536):
+		exponents = [(row >> (4 * j)) & 0xF for j in range(4)]
+		values = [1 << e if e else 0 for e in exponents]
+		empty[row] = exponents.count(0)
+		max_exponent[row] = max(exponents)
+		smoothness[row] = sum(abs(values[j] - values[j + 1]) for j in range(3))
+		for i in range(4):
+			monotonicity[i][row] = sum(values[j] * MONOTONICITY_WEIGHTS[i][j] for j in range(4))
+	return (empty, max_exponent, smoothness, monotonicity)
+
+
+def load_row_tables():
+	global row_tables
+	if row_tables is None:
+		row_tables = build_row_tables()
+	return row_tables
+
+
+def size_tables(size):
+	tables = heuristic_tables.get(size)
+	if tables is None:
+		tables = heuristic_tables[size] = (neighboring_pairs(size), monotonicity_weights(size))
+	return tables
+
+
+def wide_row_tables(size):
+	'''
+	Return the row table of size x size bitboards: (empty cells, max exponent, sum of differences between neighbours,
+	monotonicity contribution as row 0 .. size - 1) of a row, computed on its first lookup
+	'''
+	table = wide_row_measures.get(size)
+	if table is None:
+		weights = size_tables(size)[1]
+		unpack = tablesFor(size).unpack
+
+		def measure(row):
+			exponents = unpack(row)
+			values = [1 << e if e else 0 for e in exponents]
+			return (exponents.count(0), max(exponents), sum(abs(values[j] - values[j + 1]) for j in range(size - 1)),
+				tuple(sum(values[j] * weights[i][j] for j in range(size)) for i in range(size)))
+
+		table = wide_row_measures[size] = LazyTable(measure)
+	return table
+
+
+def measures(grid):
+	'''
+	Return (empty cells, max tile, monotonicity, smoothness) of a list-of-lists grid
+	'''
+	m = grid.map
+	if grid.size != 4:
+		return wide_measures(m)
+	empty_cells = m[0].count(0) + m[1].count(0) + m[2].count(0) + m[3].count(0)
+	max_tile = max(max(m[0]), max(m[1]), max(m[2]), max(m[3]))
+	monotonicity = m[3][3] + m[3][2]*0.5**2 + m[2][3]*0.5**2 + m[3][1]*0.5**4 + m[1][3]*0.5**4 + m[2][2]*0.5**4 + m[3][0]*0.5**6 + m[2][1]*0.5**6 + m[1][2]*0.5**6 + m[0][3]*0.5**6
+	smoothness = 0
+	for (i, j, k, l) in NEIGHBORING_PAIRS:
+		smoothness -= abs(m[i][j] - m[k][l])
+	return (empty_cells, max_tile, monotonicity, smoothness)
+
+
+def wide_measures(m):
+	'''
+	measures of a list-of-lists grid of any size, from the weight tables of its size
+	'''
+	(pairs, weights) = size_tables(len(m))
+	empty_cells = sum(row.count(0) for row in m)
+	max_tile = max(max(row) for row in m)
+	monotonicity = 0
+	for (row, row_weights) in zip(m, weights):
+		for (value, weight) in zip(row, row_weights):
+			monotonicity += value * weight
+	smoothness = 0
+	for (i, j, k, l) in pairs:
+		smoothness -= abs(m[i][j] - m[k][l])
+	return (empty_cells, max_tile, monotonicity, smoothness)
+
+
+def wide_bitboard_measures(grid):
+	'''
+	bitboard_measures of a bitboard grid larger than 4x4, from its row measure table
+	'''
+	table = wide_row_tables(grid.size)
+	rows = grid.tables.rows(grid.board)
+	columns = grid.tables.rows(grid.tables.transpose(grid.board))
+	e = max(table[row][1] for row in rows)
+	return (sum(table[row][0] for row in rows),
+		1 << e if e else 0,
+		sum(table[row][3][i] for (i, row) in enumerate(rows)),
+		-sum(table[row][2] for row in rows) - sum(table[column][2] for column in columns))
+
+
+def bitboard_measures(board):
+	'''
+	Return the measures of a packed bitboard by adding up the row tables over its rows and over the rows of its
+	transpose (the columns). The monotonicity weights are powers of two, so every partial sum is exact and the
+	result equals the one of measures bit for bit.
+	'''
+	(empty, max_exponent, smoothness, monotonicity) = load_row_tables()
+	rows = (board & 0xFFFF, (board >> 16) & 0xFFFF, (board >> 32) & 0xFFFF, board >> 48)
+	board = transpose(board)
+	columns = (board & 0xFFFF, (board >> 16) & 0xFFFF, (board >> 32) & 0xFFFF, board >> 48)
+	e = max(max_exponent[rows[0]], max_exponent[rows[1]], max_exponent[rows[2]], max_exponent[rows[3]])
+	return (empty[rows[0]] + empty[rows[1]] + empty[rows[2]] + empty[rows[3]],
+		1 << e if e else 0,
+		monotonicity[3][rows[3]] + monotonicity[2][rows[2]] + monotonicity[1][rows[1]] + monotonicity[0][rows[0]],
+		-sum(smoothness[row] for row in rows) - sum(smoothness[column] for column in columns))
 
 
 def eval(grid):
@@ -19,72 +183,241 @@ def eval(grid):
 	2) Max value of all tiles
 	3) Monotonicity: reward for edge strategy and difference between sides
 	4) Smoothness: difference between neighboring tiles
-	'''
 
-	# Specify the 1st measure: empty cells
-	empty_cells = len(grid.getAvailableCells())
-	
-	# Specify the 2st measure: max tile
-	max_tile = grid.getMaxTile()
-	
-	# Specify the 3rd measure: monotonicity
-	'''
-	diff_sides = sum([(m4 - m1) for m4, m1, in zip(grid.map[3], grid.map[0])])
-	diff_sides_2 = []
-	for i in range(0, grid.size):
-		temp_diff = grid.map[i][3] - grid.map[i][0]
-		diff_sides_2.append(temp_diff)
-	diff_sides_2 = sum(diff_sides_2)
-	
-	reward_edge_strategy = []
-	for i in range(0, grid.size):
-		if grid.map[i] == sorted(grid.map[i]):
-			reward_edge_strategy.append(max(grid.map[i]))
-	for j in range(0, grid.size):
-		if grid.map[3][j] >= grid.map[2][j] and grid.map[2][j] >= grid.map[1][j] and grid.map[1][j] >= grid.map[0][j]:
-			reward_edge_strategy.append(grid.map[3][j])
-	reward = sum(reward_edge_strategy)
-
-	edge_star = grid.map[3][3]
-	'''
-	monotonicity = grid.map[3][3] + grid.map[3][2]*0.5**2 + grid.map[2][3]*0.5**2 + grid.map[3][1]*0.5**4 + grid.map[1][3]*0.5**4 + grid.map[2][2]*0.5**4 + grid.map[3][0]*0.5**6 + grid.map[2][1]*0.5**6 + grid.map[1][2]*0.5**6 + grid.map[0][3]*0.5**6
-
-	# Specify the 4th measure: smoothness
-	neighboring_pairs = []
-	for i in range(0, grid.size):
-		for j in range(0, grid.size):
-			if i < 3:
-				neighboring_pairs.append((i,j,i+1,j))
-			if j < 3:
-				neighboring_pairs.append((i,j,i,j+1))
-	'''
-	diff_neighbors = []
-	sv_neighbors = []
-	for index_pair in neighboring_pairs:
-		if grid.map[index_pair[0]][index_pair[1]] != 0 and grid.map[index_pair[2]][index_pair[3]] != 0:
-			diff = abs(grid.map[index_pair[0]][index_pair[1]] - grid.map[index_pair[2]][index_pair[3]])
-			diff_neighbors.append(diff)
-		if grid.map[index_pair[0]][index_pair[1]] == grid.map[index_pair[2]][index_pair[3]]:
-			sv_neighbors.append(grid.map[index_pair[0]][index_pair[1]])
-	total_diff_neighbors = sum(diff_neighbors)
-	total_sv = sum(sv_neighbors)
-	'''
-	smoothness = []
-	for index_pair in neighboring_pairs:
-		smoothness.append(abs(grid.map[index_pair[0]][index_pair[1]]-grid.map[index_pair[2]][index_pair[3]]))
-	smoothness = -sum(smoothness)
+	Scores are cached by board, and a bitboard grid is measured with per-row lookup tables. The weight tables are
+	generated for the size of the board.
+	'''
+	key = board_key(grid)
+	score = eval_cache.get(key)
+	if score is not None:
+		return score
+
+	board = getattr(grid, 'board', None)
+	if board is not None and grid.size != 4:
+		(empty_cells, max_tile, monotonicity, smoothness) = wide_bitboard_measures(grid)
+	elif board is not None:
+		(empty_cells, max_tile, monotonicity, smoothness) = bitboard_measures(board)
+	else:
+		(empty_cells, max_tile, monotonicity, smoothness) = measures(grid)
 
 	# Calculate the final score
-	if len(grid.getAvailableCells()) != 0:	
+	if empty_cells != 0:
 		score = 3*empty_cells + max_tile + 10*monotonicity + 0.2*smoothness
 	else:
 		score = 0
 
+	if len(eval_cache) >= EVAL_CACHE_ENTRIES:
+		eval_cache.clear()
+	eval_cache[key] = score
 	return score
 
 
+# Kernel tables of every board size scored in batches so far, built by batch_tables
+batch_kernel_tables = {}
+
+
+def batch_tables(size):
+	'''
+	Return the NumPy tables of the batch kernels of a board size: the flat indexes of the two cells of every
+	neighboring pair, and the monotonicity weights as a flat vector
+	'''
+	tables = batch_kernel_tables.get(size)
+	if tables is None:
+		(pairs, weights) = size_tables(size)
+		first = np.array([i * size + j for (i, j, _, _) in pairs])
+		second = np.array([k * size + l for (_, _, k, l) in pairs])
+		tables = batch_kernel_tables[size] = (first, second, np.array(weights, dtype = np.float64).ravel())
+	return tables
+
+
+def batch_eval(values, size):
+	'''
+	eval of many boards at once, from an (N, size * size) array of their tile values in row-major order.
+	The monotonicity weights are powers of two, so the dot product is exact whatever order it adds up in, and the
+	final score takes the same floating-point steps as eval: every score equals the one of eval bit for bit.
+	'''
+	(first, second, weights) = batch_tables(size)
+	empty_cells = (values == 0).sum(axis = 1)
+	max_tile = values.max(axis = 1)
+	monotonicity = values.dot(weights)
+	smoothness = -np.abs(values[:, first] - values[:, second]).sum(axis = 1)
+	scores = 3*empty_cells + max_tile + 10*monotonicity + 0.2*smoothness
+	return np.where(empty_cells != 0, scores, 0)
+
+
 # Set time limit to 0.2 seconds for each move
 time_limit = 0.2
+
+# Nodes searched between two readings of the clock
+CHECK_EVERY = 64
+
+# Budget of the move being searched, set by start_budget: the deadline on the time.perf_counter clock, the node
+# limit, the nodes searched so far and the node count at which the budget is checked next
+(deadline, node_limit, nodes, next_check) = (math.inf, None, 0, CHECK_EVERY)
+
+
+def start_budget(move_deadline, move_node_limit):
+	global deadline, node_limit, nodes, next_check
+	(deadline, node_limit, nodes, next_check) = (move_deadline, move_node_limit, 0, 0)
+
+
+def check_budget():
+	'''
+	Count a searched node; every CHECK_EVERY nodes (and exactly at the node limit) end the search of the move if its
+	time or node budget is spent
+	'''
+	global nodes
+	nodes += 1
+	if nodes >= next_check:
+		checkpoint()
+
+
+def checkpoint():
+	global next_check
+	if (node_limit is not None and nodes > node_limit) or time.perf_counter() >= deadline:
+		raise(Time_out_exception)
+	next_check = nodes + CHECK_EVERY
+	if node_limit is not None and next_check > node_limit + 1:
+		next_check = node_limit + 1
+
+
+# Bound types of a transposition table value
+(EXACT, LOWER, UPPER) = (0, 1, 2)
+
+# Kinds of positions, kept in the low 2 bits of a transposition table key
+(MAX_NODE, MIN_NODE, CHANCE_NODE) = (0, 1, 3)
+
+# Search modes of PlayerAI
+(ALPHA_BETA, EXPECTIMAX) = ('alphabeta', 'expectimax')
+
+# Root moves searched, if not all of them (set in the workers of a root-split search)
+root_moves = None
+
+# Seconds a root-split search keeps for collecting the answers of its workers
+ROOT_SPLIT_MARGIN = 0.01
+
+# Tiles the computer places and their odds, as in GameManager_3 (defaultProbability)
+TILE_PROBABILITIES = ((2, 0.9), (4, 0.1))
+
+# Whether expectimax scores the leaves below a chance node in one batch (set by getMove)
+batch_leaves = False
+
+# Approximate memory taken by one stored entry (slot, tuple, key and value), used to turn a size in MB into slots
+ENTRY_BYTES = 200
+
+
+def board_key(grid):
+	'''
+	Pack a grid into one integer: the packed board of a bitboard grid, otherwise a 1 bit followed by 5 bits per cell
+	holding log2(tile) + 1 (0 for an empty cell); the leading bit keeps the two kinds of keys apart. A bitboard larger
+	than 4x4 gets a 1 bit above its cells as well; its cells have at least 6 bits, so the keys of every kind and size
+	have different lengths.
+	'''
+	board = getattr(grid, 'board', None)
+	if board is not None:
+		if grid.size != 4:
+			return board | 1 << grid.tables.boardBits
+		return board
+	key = 1
+	for row in grid.map:
+		for value in row:
+			key = (key << 5) | value.bit_length()
+	return key
+
+
+class Transposition_table:
+	'''
+	Bounded table of searched positions, kept across the moves of a game. Each slot holds one entry
+	(key, generation, remaining depth, value, bound type, best move), and a key always maps to the same slot.
+	A new entry replaces the one in its slot if that slot is empty, holds the same position, was stored during an
+	earlier move (older generation) or was searched no deeper than the new one. The table also keeps the history
+	scores of moves and tile placements that caused cutoffs, used to order the children of positions it misses.
+	'''
+	def __init__(self, size_mb = 16):
+		self.slots = [None] * max(1, int(size_mb * 1024 * 1024 / ENTRY_BYTES))
+		self.generation = 0
+		self.hits = 0
+		self.misses = 0
+		self.cutoffs = 0
+		self.stores = 0
+		self.replacements = 0
+		self.history = {}
+
+	def new_search(self):
+		'''
+		Start the search of a new move; entries of earlier moves stay usable but may be replaced by any new entry,
+		and history scores are halved so that recent cutoffs count more
+		'''
+		self.generation += 1
+		for move in self.history:
+			self.history[move] //= 2
+
+	def lookup(self, key):
+		entry = self.slots[key % len(self.slots)]
+		if entry is not None and entry[0] == key:
+			self.hits += 1
+			return entry
+		self.misses += 1
+		return None
+
+	def store(self, key, depth, value, bound, move):
+		index = key % len(self.slots)
+		old = self.slots[index]
+		if old is not None and old[0] != key:
+			if old[1] == self.generation and old[2] > depth:
+				return
+			self.replacements += 1
+		self.slots[index] = (key, self.generation, depth, value, bound, move)
+		self.stores += 1
+
+	def record_cutoff(self, move, depth):
+		'''
+		Credit a move or tile placement that cut off the search of a position with depth plies left
+		'''
+		self.history[move] = self.history.get(move, 0) + depth * depth
+
+	def stats(self):
+		'''
+		Return the counters, for tuning the table size
+		'''
+		probes = self.hits + self.misses
+		return {
+			'slots': len(self.slots),
+			'hits': self.hits,
+			'misses': self.misses,
+			'hit_rate': float(self.hits) / probes if probes else 0.0,
+			'cutoffs': self.cutoffs,
+			'stores': self.stores,
+			'replacements': self.replacements,
+		}
+
+
+# Table of searches that do not come from a PlayerAI, which installs its own table for each move
+transposition_table = Transposition_table()
+
+
+def probe(key, depth, alpha, beta):
+	'''
+	Look up a position searched to at least depth more plies; return the entry and whether its value settles the
+	search of the position for the window (alpha, beta)
+	'''
+	entry = transposition_table.lookup(key)
+	if entry is None or entry[2] < depth:
+		return (entry, False)
+	(value, bound) = entry[3:5]
+	if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+		transposition_table.cutoffs += 1
+		return (entry, True)
+	return (entry, False)
+
+
+def ordered(moves, entry):
+	'''
+	Sort moves (or tile placements) for searching: the best move stored in a table entry first, then by history score
+	'''
+	best = entry[5] if entry is not None else None
+	history = transposition_table.history
+	return sorted(moves, key = lambda move: (move != best, -history.get(move, 0)))
 	
 
 class State:
@@ -93,44 +426,39 @@ class State:
 	'''
 	def __init__(self, grid, move = None, depth = 0):
 		self.grid = grid
-		self.eval = eval(self.grid)
 		self.move = move
 		self.depth = depth
 
 	def __str__(self):
 		return(str(self.grid.map))
 
-	def max_children(self):
+	@property
+	def eval(self):
+		return eval(self.grid)
+
+	def max_children(self, moves = None):
 		'''
-		Return a list of children states of the current state for the maximum algorithm
+		Yield the children states of the current state for the maximum algorithm, one per move in moves (by default
+		all available moves) and in that order. A child is only built when the search asks for it.
 		'''
-		children = []
-		moves = self.grid.getAvailableMoves()
+		if moves is None:
+			moves = self.grid.getAvailableMoves()
 		for move in moves:
 			temp_grid = self.grid.clone()
 			temp_grid.move(move)
-			children.append(State(temp_grid, move, self.depth + 1))
-		children = sorted(children, key = attrgetter('eval'))
-		children.reverse()
-
-		return children
+			yield State(temp_grid, move, self.depth + 1)
 
-	def min_children(self):
+	def min_children(self, placements = None):
 		'''
-		Return a list of children states of the current state for the minimum algorithm
+		Yield the children states of the current state for the minimum algorithm, one per (cell, tile) placement in
+		placements (by default a 2 and a 4 in every empty cell) and in that order
 		'''
-		children = []
-		moves = self.grid.getAvailableCells()
-		for move in moves:
+		if placements is None:
+			placements = [(cell, tile) for cell in self.grid.getAvailableCells() for tile in (2, 4)]
+		for placement in placements:
 			temp_grid = self.grid.clone()
-			temp_grid_2 = self.grid.clone()
-			temp_grid.map[move[0]][move[1]] = 2
-			temp_grid_2.map[move[0]][move[1]] = 4
-			children.append(State(temp_grid, None, self.depth + 1))
-			children.append(State(temp_grid_2, None, self.depth + 1))
-		children = sorted(children, key = attrgetter('eval'))
-
-		return children
+			temp_grid.setCellValue(placement[0], placement[1])
+			yield State(temp_grid, placement, self.depth + 1)
 
 def minimize(state, alpha, beta, max_depth):
 	'''
@@ -139,18 +467,29 @@ def minimize(state, alpha, beta, max_depth):
 
 	global start_time, exceed_times
 
-	if time.clock() - start_time >= time_limit:
-		raise(Time_out_exception)
+	check_budget()
 
-	if len(state.min_children()) == 0:
+	# Look the position up; the computer to move makes it distinct from the same board with the player to move
+	depth = max_depth - state.depth
+	key = board_key(state.grid) << 2 | MIN_NODE
+	entry = None
+	if depth > 0:
+		(entry, settled) = probe(key, depth, alpha, beta)
+		if settled:
+			return (None, entry[3])
+
+	cells = state.grid.getAvailableCells()
+	if len(cells) == 0:
 		return (None, eval(state.grid))
 
 	if state.depth >= max_depth:
 		return (None, eval(state.grid))
 
 	(min_child, min_util) = (None, math.inf)
+	beta_0 = beta
 
-	for child in state.min_children():
+	placements = [(cell, tile) for cell in cells for tile in (2, 4)]
+	for child in state.min_children(ordered(placements, entry)):
 
 		(_, util) = maximize(child, alpha, beta, max_depth)
 
@@ -158,11 +497,20 @@ def minimize(state, alpha, beta, max_depth):
 			(min_child, min_util) = (child, util)
 
 		if min_util <= alpha:
+			transposition_table.record_cutoff(child.move, depth)
 			break
 
 		if min_util < beta:
 			beta = min_util
 
+	if min_util <= alpha:
+		bound = UPPER
+	elif min_util >= beta_0:
+		bound = LOWER
+	else:
+		bound = EXACT
+	transposition_table.store(key, depth, min_util, bound, min_child.move)
+
 	return (min_child, min_util)
 
 
@@ -171,12 +519,23 @@ def maximize(state, alpha, beta, max_depth):
 	Specify the minimize algorithm as shown in class
 	'''
 
-	global start_time, exceed_times
+	global start_time, exceed_times, root_best
 
-	if time.clock() - start_time >= time_limit:
-		raise(Time_out_exception)
+	check_budget()
+
+	# Look the position up, but search the root anyway since decision needs its best child
+	depth = max_depth - state.depth
+	key = board_key(state.grid) << 2 | MAX_NODE
+	entry = None
+	if depth > 0:
+		(entry, settled) = probe(key, depth, alpha, beta)
+		if settled and state.depth != 0:
+			return (None, entry[3])
 
-	if len(state.max_children()) == 0:
+	moves = state.grid.getAvailableMoves()
+	if state.depth == 0 and root_moves is not None:
+		moves = [move for move in moves if move in root_moves]
+	if len(moves) == 0:
 		return (None, eval(state.grid))
 
 	if state.depth >= max_depth:
@@ -184,20 +543,33 @@ def maximize(state, alpha, beta, max_depth):
 
 
 	(max_child, max_util) = (None, -math.inf)
+	alpha_0 = alpha
 
-	for child in state.max_children():
+	for child in state.max_children(ordered(moves, entry)):
 
 		(_, util) = minimize(child, alpha, beta, max_depth)
 
 		if util > max_util:
 			(max_child, max_util) = (child, util)
+			# Keep the best completely searched root move, in case the iteration runs out of time
+			if state.depth == 0:
+				root_best = max_child
 
 		if max_util >= beta:
+			transposition_table.record_cutoff(child.move, depth)
 			break
 
 		if max_util > alpha:
 			alpha = max_util
 
+	if max_util <= alpha_0:
+		bound = UPPER
+	elif max_util >= beta:
+		bound = LOWER
+	else:
+		bound = EXACT
+	transposition_table.store(key, depth, max_util, bound, max_child.move)
+
 	return (max_child, max_util)
 
 
@@ -206,16 +578,208 @@ def decision(state, max_depth):
 	Specify the decision function as shown in class
 	'''
 
-	global start_time, exceed_times
+	global start_time, exceed_times, root_best, root_value
+	root_best = None
 
 	(child, util) = maximize(state, -math.inf, math.inf, max_depth)
 	
 	print(util)
 
+	root_value = util
 	return child
 
 
 
+def expectimax_max(state, probability, max_depth):
+	'''
+	Value of a position with the player to move in expectimax: the best value over the available moves of the chance
+	nodes they lead to. probability is the chance of reaching the position from the root.
+	'''
+
+	global depth_limited, root_best
+
+	check_budget()
+
+	if state.depth >= max_depth:
+		depth_limited = True
+		return (None, eval(state.grid))
+
+	moves = state.grid.getAvailableMoves()
+	if state.depth == 0 and root_moves is not None:
+		moves = [move for move in moves if move in root_moves]
+	if len(moves) == 0:
+		return (None, eval(state.grid))
+
+	(max_child, max_util) = (None, -math.inf)
+
+	for child in state.max_children(moves):
+
+		util = expectimax_chance(child, probability, max_depth)
+
+		if util > max_util:
+			(max_child, max_util) = (child, util)
+			if state.depth == 0:
+				root_best = max_child
+
+	return (max_child, max_util)
+
+
+def expectimax_chance(state, probability, max_depth):
+	'''
+	Value of a position with the computer to move in expectimax: the average over the empty cells (or a sample of
+	cell_samples of them) of a 2 and a 4 placed there, weighted by TILE_PROBABILITIES. A position reached with a
+	probability below probability_cutoff is not searched further but evaluated.
+	'''
+
+	global depth_limited
+
+	check_budget()
+
+	if probability < probability_cutoff:
+		return eval(state.grid)
+
+	if state.depth >= max_depth:
+		depth_limited = True
+		return eval(state.grid)
+
+	# A chance entry keeps, in place of a best move, the probability it was searched with and whether its search
+	# reached the depth limit. It answers searches at most as likely (its probability cutoffs pruned no more), and
+	# passes on its depth limit so that a hit does not pass for a converged search.
+	depth = max_depth - state.depth
+	key = board_key(state.grid) << 2 | CHANCE_NODE
+	entry = transposition_table.lookup(key)
+	if entry is not None and entry[2] >= depth and entry[5][0] >= probability:
+		transposition_table.cutoffs += 1
+		depth_limited = depth_limited or entry[5][1]
+		return entry[3]
+
+	cells = state.grid.getAvailableCells()
+	if cell_samples is not None and len(cells) > cell_samples:
+		cells = sampler.sample(cells, cell_samples)
+
+	if batch_leaves and state.depth + 1 >= max_depth:
+		util = frontier_chance(state.grid, cells)
+		transposition_table.store(key, depth, util, EXACT, (probability, True))
+		return util
+
+	outer_limited = depth_limited
+	depth_limited = False
+	util = 0
+	for cell in cells:
+		for tile, tile_probability in TILE_PROBABILITIES:
+			temp_grid = state.grid.clone()
+			temp_grid.setCellValue(cell, tile)
+			child = State(temp_grid, (cell, tile), state.depth + 1)
+			(_, child_util) = expectimax_max(child, probability * tile_probability / len(cells), max_depth)
+			util += tile_probability * child_util
+	util /= len(cells)
+
+	transposition_table.store(key, depth, util, EXACT, (probability, depth_limited))
+	depth_limited = depth_limited or outer_limited
+
+	return util
+
+
+def frontier_chance(grid, cells):
+	'''
+	Value of a chance node whose children are all leaves, as the loop of expectimax_chance would find it: the
+	children are built as rows of one array (the tile values of the grid with one tile placed) and scored together
+	by batch_eval, without a State, a grid copy or a call of eval per child.
+	Batches hold the children of one chance node, not a whole frontier layer: gathering a layer means deferring
+	every value above it until its leaves are scored, transposition entries included, and measured no faster, as
+	scoring leaves is a small part of the search and the leaves cut off by probability mostly hit eval_cache.
+	'''
+	global depth_limited, nodes
+
+	# The children count against the budget like the leaves expectimax_max would visit
+	nodes += len(cells) * len(TILE_PROBABILITIES)
+	if nodes >= next_check:
+		# A loop over the children would stop right after the child that crossed the node limit
+		if node_limit is not None and nodes > node_limit:
+			nodes = node_limit + 1
+		checkpoint()
+	depth_limited = True
+
+	size = grid.size
+	children = np.repeat(np.array(grid.map, dtype = np.int64).reshape(1, size * size),
+		len(cells) * len(TILE_PROBABILITIES), axis = 0)
+	placed = [x * size + y for (x, y) in cells for _ in TILE_PROBABILITIES]
+	children[np.arange(len(placed)), placed] = [tile for _ in cells for (tile, _) in TILE_PROBABILITIES]
+	scores = batch_eval(children, size).tolist()
+
+	# Add up in the order of expectimax_chance, so the value is the same to the last bit
+	util = 0
+	i = 0
+	for _ in cells:
+		for (_, tile_probability) in TILE_PROBABILITIES:
+			util += tile_probability * scores[i]
+			i += 1
+	return util / len(cells)
+
+
+def expectimax_decision(state, max_depth):
+	'''
+	Pick the move with the highest expected value, searching to at most max_depth plies
+	'''
+
+	global depth_limited, root_best, root_value
+	(depth_limited, root_best) = (False, None)
+
+	(child, util) = expectimax_max(state, 1.0, max_depth)
+
+	root_value = util
+	return child
+
+
+def encode_grid(grid):
+	'''
+	Compact encoding of a grid for sending it to another process: its kind, its size and its board_key
+	'''
+	return (getattr(grid, 'board', None) is not None, grid.size, board_key(grid))
+
+
+def decode_grid(encoding):
+	'''
+	Rebuild a grid from encode_grid
+	'''
+	(bitboard, size, key) = encoding
+	if bitboard:
+		grid = BitGrid(size)
+		grid.board = key & ((1 << grid.tables.boardBits) - 1)
+		return grid
+	grid = Grid(size)
+	for cell in range(size * size - 1, -1, -1):
+		grid.map[cell // size][cell % size] = 1 << ((key & 31) - 1) if key & 31 else 0
+		key >>= 5
+	return grid
+
+
+def root_split_worker(settings, tasks, results):
+	'''
+	Persistent worker process of a root-split search. It keeps one PlayerAI (and so one transposition table) for the
+	whole game, and for every task (task number, encoded grid, root moves, deadline, node limit) read from its task
+	pipe runs the usual iterative deepening restricted to those root moves. It answers on its own result pipe with the
+	task number, the (depth, best move, value) of every completed iteration and whether the search stopped because a
+	deeper one would not change anything (expectimax only). Pipes rather than a shared queue keep a worker that dies
+	from taking the others down with it (it could die holding the lock of the queue).
+	'''
+	sys.stdout = open(os.devnull, 'w')
+	player = PlayerAI(**settings)
+	while True:
+		try:
+			task = tasks.recv()
+		except EOFError:
+			return
+		if task is None:
+			return
+		(task_number, encoding, moves, deadline, player.node_limit) = task
+		# perf_counter is the system-wide monotonic clock, so the deadline of the parent holds here too
+		player.time_limit = deadline - time.perf_counter()
+		player.getMove(decode_grid(encoding), moves)
+		iterations = [(depth, move, value) for (depth, _, _, move, value) in player.iterations]
+		results.send((task_number, iterations, player.converged, player.move_nodes))
+
+
 class Time_out_exception(Exception):
 	'''
 	Handle an exception if running time for a move is over the time limit
@@ -227,22 +791,205 @@ class PlayerAI(BaseAI):
 	'''
 	Specify the PlayerAI class that inherits from the BaseAI class
 	'''
-	def getMove(self, grid):
+	def __init__(self, table_size_mb = 16, mode = ALPHA_BETA, probability_cutoff = 0.003, cell_samples = None, seed = 0,
+		time_limit = time_limit, node_limit = None, workers = 1, batch_leaves = False):
+		'''
+		mode picks alpha-beta minimax (the computer as an adversary) or expectimax (the computer as the random
+		player it is). For expectimax, probability_cutoff and cell_samples bound the chance nodes searched.
+		Each move is searched until time_limit seconds have passed or, if set, node_limit nodes were searched;
+		a node budget alone (time_limit = math.inf) makes the moves independent of the speed of the machine.
+		With workers > 1 the root moves are split over that many persistent worker processes. batch_leaves makes
+		expectimax score the leaves below each chance node of its last layer in one NumPy batch (one batch per chance
+		node rather than per layer, see frontier_chance).
+		'''
+		if mode not in (ALPHA_BETA, EXPECTIMAX):
+			raise ValueError('unknown search mode %s' % mode)
+		if batch_leaves and np is None:
+			raise ImportError('batched leaf evaluation needs NumPy')
+		self.mode = mode
+		self.batch_leaves = batch_leaves
+		self.probability_cutoff = probability_cutoff
+		self.cell_samples = cell_samples
+		self.sampler = random.Random(seed)
+		self.time_limit = time_limit
+		self.node_limit = node_limit
+		# Depth of the last completed iteration, whether the move came from the deeper interrupted one, whether
+		# expectimax stopped because deeper iterations would not change anything, and the
+		# (depth, nodes, seconds, best move, value) of every completed iteration of the last move
+		self.depth_reached = 0
+		self.partial = False
+		self.converged = False
+		self.iterations = []
+		# Nodes searched for the last move and over all moves
+		self.move_nodes = 0
+		self.nodes = 0
+		# The transposition table lives as long as the player, so positions searched for one move help the next
+		self.table = Transposition_table(table_size_mb)
+		# Build the bitboard row tables now rather than during the first move, which they would not fit in
+		load_row_tables()
+		self.workers = []
+		if workers > 1:
+			settings = dict(table_size_mb = table_size_mb, mode = mode, probability_cutoff = probability_cutoff,
+				cell_samples = cell_samples, seed = seed, batch_leaves = batch_leaves)
+			self.task_number = 0
+			for _ in range(workers):
+				(task_reader, tasks) = multiprocessing.Pipe(duplex = False)
+				(results, result_writer) = multiprocessing.Pipe(duplex = False)
+				process = multiprocessing.Process(target = root_split_worker, args = (settings, task_reader,
+					result_writer))
+				process.daemon = True
+				process.start()
+				# Only the worker keeps its ends, so its result pipe reports the end of file if it dies
+				task_reader.close()
+				result_writer.close()
+				self.workers.append((process, tasks, results))
+
+	def close(self):
+		'''
+		Stop the worker processes of a root-split search
+		'''
+		for (process, tasks, results) in self.workers:
+			try:
+				tasks.send(None)
+			except OSError:
+				pass
+		for (process, tasks, results) in self.workers:
+			process.join(1)
+			tasks.close()
+			results.close()
+		self.workers = []
+
+	def split_move(self, grid):
+		'''
+		Search the root moves in parallel: each worker gets a share of them and the deadline of the move. Values of
+		different depths do not compare, so the best move is taken at the deepest depth every worker completed
+		(a converged expectimax worker counts as having completed every depth with its last value). The answers are
+		awaited until the end of the move; a worker that died or did not answer in time is left out, and without any
+		answer the first legal move is played.
+		'''
+		deadline = time.perf_counter() + self.time_limit - ROOT_SPLIT_MARGIN
+		moves = grid.getAvailableMoves()
+		if len(moves) <= 1:
+			return moves[0] if moves else None
+		self.workers = [worker for worker in self.workers if worker[0].is_alive()]
+		groups = [moves[i::len(self.workers)] for i in range(min(len(self.workers), len(moves)))]
+		# Answers are numbered by move, so a late answer to an earlier move is not taken for one of this move
+		self.task_number += 1
+		encoding = encode_grid(grid)
+		waiting = []
+		for group, (_, tasks, results) in zip(groups, self.workers):
+			try:
+				tasks.send((self.task_number, encoding, group, deadline, self.node_limit))
+				waiting.append(results)
+			except OSError:
+				pass
+		answers = []
+		while waiting:
+			# Without a time limit (a node budget alone) wait until every worker answered or died
+			remaining = deadline + ROOT_SPLIT_MARGIN - time.perf_counter()
+			ready = multiprocessing.connection.wait(waiting, timeout = max(0, remaining) if remaining < math.inf else None)
+			if not ready:
+				break
+			for results in ready:
+				try:
+					answer = results.recv()
+				except EOFError:
+					waiting.remove(results)
+					continue
+				if answer[0] == self.task_number:
+					waiting.remove(results)
+					answers.append(answer[1:])
+
+		finished = [(iterations, converged) for (iterations, converged, _) in answers if iterations]
+		open_depths = [iterations[-1][0] for (iterations, converged) in finished if not converged]
+		if open_depths:
+			depth = min(open_depths)
+		else:
+			depth = max([iterations[-1][0] for (iterations, _) in finished] or [0])
+		(best_move, best_value) = (moves[0], -math.inf)
+		for (iterations, converged) in finished:
+			# Iterations run from depth 1 up; only a converged worker can stop short of depth
+			(_, move, value) = iterations[min(depth, len(iterations)) - 1]
+			if value > best_value:
+				(best_move, best_value) = (move, value)
+		self.depth_reached = depth
+		self.move_nodes = sum(nodes for (_, _, nodes) in answers)
+		self.nodes += self.move_nodes
+		self.iterations = []
+		return best_move
+
+	def worth_deepening(self, root_moves):
+		'''
+		Predict the cost of the next iteration from the last one times a branching factor per ply, and start it only
+		if the remaining budget covers its first root move: the result of a completely searched root move is used even
+		when the iteration is cut off. Iterations ending on player and on computer nodes alternate between larger and
+		smaller factors, so the factor between the last two iterations is also compared with the per-ply growth
+		between the last one and the one two plies before it (the same kind of node); the smaller is used. The first
+		iteration only reaches the children of the root, too few nodes to measure from, so three iterations always run.
+		'''
+		if len(self.iterations) < 3:
+			return True
+		(_, last_nodes, last_time, _, _) = self.iterations[-1]
+		last_factor = float(last_nodes) / max(1, self.iterations[-2][1])
+		same_kind_factor = math.sqrt(float(last_nodes) / max(1, self.iterations[-3][1]))
+		branching = max(1.0, min(last_factor, same_kind_factor))
+		share = 1.0 / max(1, root_moves)
+		if time.perf_counter() + last_time * branching * share > deadline:
+			return False
+		if node_limit is not None and nodes + last_nodes * branching * share > node_limit:
+			return False
+		return True
+
+	def getMove(self, grid, moves = None):
+		'''
+		Return the move to play; moves restricts the root moves searched (used by the workers of a root-split search)
+		'''
+		if self.workers:
+			return self.split_move(grid)
 		initial_state = State(grid, None, 0)
 		# Keep record of the start time
 		global start_time
-		start_time = time.clock()
+		start_time = time.perf_counter()
+		start_budget(start_time + self.time_limit, self.node_limit)
+		global transposition_table
+		transposition_table = self.table
+		transposition_table.new_search()
 		global exceed_times
 		exceed_times = 0
+		global probability_cutoff, cell_samples, sampler, batch_leaves
+		(probability_cutoff, cell_samples, sampler) = (self.probability_cutoff, self.cell_samples, self.sampler)
+		batch_leaves = self.batch_leaves
+		global root_moves
+		root_moves = moves
+		search = decision if self.mode == ALPHA_BETA else expectimax_decision
+		moves = grid.getAvailableMoves() if moves is None else moves
 		# Perform iterative deepening on the minimax algorithm
-		max_depth = 1
-		last_decision = decision(initial_state, max_depth)
+		(max_depth, last_decision) = (0, None)
+		(self.partial, self.converged, self.iterations) = (False, False, [])
 		while True:
-			max_depth += 1
+			if last_decision is not None:
+				# Once no expectimax branch reached the depth limit, a deeper search would find the same move
+				if self.mode == EXPECTIMAX and not depth_limited:
+					self.converged = True
+					break
+				if not self.worth_deepening(len(moves)):
+					break
+			(iteration_time, iteration_nodes) = (time.perf_counter(), nodes)
 			try:
-				last_decision = decision(initial_state, max_depth)
+				child = search(initial_state, max_depth + 1)
 			except Time_out_exception:
+				if root_best is not None:
+					(last_decision, self.partial) = (root_best, True)
 				break
+			max_depth += 1
+			last_decision = child
+			self.iterations.append((max_depth, nodes - iteration_nodes, time.perf_counter() - iteration_time, child.move, root_value))
+		self.depth_reached = max_depth
+		self.move_nodes = nodes
+		self.nodes += nodes
+		if last_decision is None:
+			# Not even one root move was searched within the budget
+			return moves[0] if moves else None
 		return last_decision.move
 
 
@@ -0,0 +1,204 @@
+'''
+Sheng Zhang
+HW2 | Adversarial Search Problem: 2048-Game -- headless self-play
+
+Usage: python SelfPlay_3.py [--games N] [--workers W] [--mode alphabeta,expectimax] [--grid list,bitboard]
+                            [--size 4,5,6] [--time-limit S | --node-limit N] [--batch-leaves] [--output games.jsonl]
+
+Plays seeded games of PlayerAI against the random computer without a display and without waiting out the turn
+timer, spread over a pool of worker processes. Every combination of the comma-separated modes, grids and board sizes
+is one configuration; the summary gives its max-tile distribution, score, moves per second and nodes per second, so
+running it over several sizes benchmarks the search speed per board size. With a node budget and no time limit the
+games only depend on their seeds.
+'''
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import statistics
+import multiprocessing
+
+from Grid_3 import Grid
+from BitGrid_3 import Grid as BitGrid
+import PlayerAI_3
+from PlayerAI_3 import ALPHA_BETA, EXPECTIMAX, PlayerAI
+
+GRIDS = {'list': Grid, 'bitboard': BitGrid}
+
+# Odds of the computer placing a 2, as GameManager_3.defaultProbability
+PROBABILITY_OF_2 = 0.9
+
+
+def new_tile(grid, rng):
+	'''
+	Place a tile the way GameManager_3 does: a random empty cell, a 2 with 90% odds and a 4 otherwise
+	'''
+	cells = grid.getAvailableCells()
+	tile = 2 if rng.randint(0, 99) < 100 * PROBABILITY_OF_2 else 4
+	grid.setCellValue(cells[rng.randint(0, len(cells) - 1)], tile)
+	return tile
+
+
+def score(grid, fours):
+	'''
+	Score of the usual 2048 rules (the sum of all merged tiles): a tile of 2**k took k - 1 merges worth 2**k each to
+	build, except for the fours placed by the computer, which were not merged
+	'''
+	total = 0
+	for row in grid.map:
+		for value in row:
+			if value > 2:
+				total += (value.bit_length() - 2) * value
+	return total - 4 * fours
+
+
+def play_game(job):
+	'''
+	Play one game in a worker process and return its record
+	'''
+	(config, seed) = job
+	rng = random.Random(seed)
+	grid = GRIDS[config['grid']](config['size'])
+	player = PlayerAI(mode = config['mode'], probability_cutoff = config['probability_cutoff'],
+		cell_samples = config['cell_samples'], seed = seed, time_limit = config['time_limit'],
+		node_limit = config['node_limit'], batch_leaves = config['batch_leaves'])
+
+	fours = 0
+	for _ in range(2):
+		fours += new_tile(grid, rng) == 4
+	moves = 0
+	think_time = 0.0
+	depths = 0
+	status = 'over'
+	while grid.canMove():
+		if config['max_moves'] is not None and moves >= config['max_moves']:
+			status = 'move_limit'
+			break
+		start_time = time.time()
+		move = player.getMove(grid.clone())
+		think_time += time.time() - start_time
+		if move is None or not grid.canMove([move]):
+			status = 'invalid_move'
+			break
+		grid.move(move)
+		moves += 1
+		depths += player.depth_reached
+		fours += new_tile(grid, rng) == 4
+
+	return {
+		'config': config['name'],
+		'seed': seed,
+		'status': status,
+		'max_tile': grid.getMaxTile(),
+		'score': score(grid, fours),
+		'moves': moves,
+		'nodes': player.nodes,
+		'think_time': think_time,
+		'mean_depth': float(depths) / moves if moves else 0.0,
+	}
+
+
+def init_worker():
+	# decision prints the value of every search
+	sys.stdout = open(os.devnull, 'w')
+
+
+def summarise(games):
+	'''
+	Return the statistics of the games of one configuration
+	'''
+	think_time = sum(game['think_time'] for game in games)
+	moves = sum(game['moves'] for game in games)
+	nodes = sum(game['nodes'] for game in games)
+	tiles = {}
+	for game in games:
+		tiles[game['max_tile']] = tiles.get(game['max_tile'], 0) + 1
+	scores = [game['score'] for game in games]
+	return {
+		'games': len(games),
+		'max_tiles': dict((tile, tiles[tile]) for tile in sorted(tiles)),
+		'mean_score': statistics.mean(scores),
+		'median_score': statistics.median(scores),
+		'mean_depth': statistics.mean(game['mean_depth'] for game in games),
+		'moves_per_second': moves / think_time if think_time else 0.0,
+		'nodes_per_second': nodes / think_time if think_time else 0.0,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Play seeded 2048 games headless and report statistics')
+	parser.add_argument('--games', type = int, default = 100, help = 'games per configuration')
+	parser.add_argument('--seed', type = int, default = 0, help = 'seed of the first game; game i uses seed + i')
+	parser.add_argument('--workers', type = int, default = multiprocessing.cpu_count())
+	parser.add_argument('--mode', default = 'alphabeta', help = 'comma-separated search modes (alphabeta, expectimax)')
+	parser.add_argument('--grid', default = 'bitboard', help = 'comma-separated grids (list, bitboard)')
+	parser.add_argument('--size', default = '4', help = 'comma-separated board sizes')
+	parser.add_argument('--time-limit', type = float, help = 'seconds per move (default 0.2 without a node limit)')
+	parser.add_argument('--node-limit', type = int, help = 'nodes searched per move')
+	parser.add_argument('--probability-cutoff', type = float, default = 0.003, help = 'expectimax probability cutoff')
+	parser.add_argument('--cell-samples', type = int, help = 'expectimax empty cells sampled per chance node')
+	parser.add_argument('--batch-leaves', action = 'store_true', help = 'score expectimax leaves in NumPy batches')
+	parser.add_argument('--max-moves', type = int, help = 'stop a game after this many moves')
+	parser.add_argument('--output', help = 'write one JSON record per game to this file')
+	args = parser.parse_args()
+
+	# Fail here rather than in every worker of the pool
+	if args.batch_leaves and PlayerAI_3.np is None:
+		parser.error('--batch-leaves needs NumPy, which is not installed')
+	if args.time_limit is None:
+		args.time_limit = math.inf if args.node_limit is not None else 0.2
+	configs = []
+	for mode in args.mode.split(','):
+		if mode not in (ALPHA_BETA, EXPECTIMAX):
+			parser.error('unknown mode %s' % mode)
+		for grid in args.grid.split(','):
+			if grid not in GRIDS:
+				parser.error('unknown grid %s' % grid)
+			for size in args.size.split(','):
+				if not size.isdigit() or int(size) < 2:
+					parser.error('bad board size %s' % size)
+				configs.append({
+					'name': '%s/%s/%sx%s' % (mode, grid, size, size),
+					'mode': mode,
+					'grid': grid,
+					'size': int(size),
+					'time_limit': args.time_limit,
+					'node_limit': args.node_limit,
+					'probability_cutoff': args.probability_cutoff,
+					'cell_samples': args.cell_samples,
+					'batch_leaves': args.batch_leaves,
+					'max_moves': args.max_moves,
+				})
+	jobs = [(config, args.seed + i) for config in configs for i in range(args.games)]
+
+	results = dict((config['name'], []) for config in configs)
+	output_file = open(args.output, 'w') if args.output else None
+	start_time = time.time()
+	pool = multiprocessing.Pool(args.workers, init_worker)
+	try:
+		for game in pool.imap_unordered(play_game, jobs):
+			results[game['config']].append(game)
+			if output_file is not None:
+				output_file.write(json.dumps(game, sort_keys = True) + '\n')
+				output_file.flush()
+	finally:
+		pool.terminate()
+		pool.join()
+		if output_file is not None:
+			output_file.close()
+
+	for config in configs:
+		summary = summarise(results[config['name']])
+		print('%s: %d games, mean score %.0f, median score %.0f, mean depth %.2f, %.1f moves/s, %.0f nodes/s' % (
+			config['name'], summary['games'], summary['mean_score'], summary['median_score'], summary['mean_depth'],
+			summary['moves_per_second'], summary['nodes_per_second']))
+		print('  max tiles: ' + ', '.join('%d: %d' % item for item in summary['max_tiles'].items()))
+	print('%d games in %.1f s' % (len(jobs), time.time() - start_time))
+
+
+if __name__ == '__main__':
+	main()